@@ -1,16 +1,28 @@
 from fastapi import APIRouter, HTTPException, Header
 from fastapi.responses import StreamingResponse
-from app.models.chat import ChatRequest, ChatResponse, SandboxRequest, SandboxResponse
+from starlette.background import BackgroundTask
+from app.api.sse import SSEEncoder, coalesce_chunks, dumps
+from app.models.chat import BatchRequest, ChatRequest, ChatResponse, SandboxRequest, SandboxResponse, StreamChunk
+from app.services.admission import AdmissionRejected, Ticket, sandbox_admission
 from app.services.gemini_service import gemini_service
 from app.services.memory_service import memory_service
+from app.services.metrics import StreamTimer
 from app.services.sandbox_service import sandbox_service
+from app.services.stream_registry import ReplayStream, stream_registry
 from datetime import datetime
 from pydantic import BaseModel
-import json
-import uuid
+import os
+import time
+from typing import Any, Dict, List
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+# Stream framing: merge tiny deltas for up to SSE_COALESCE_MS (0 disables) or
+# SSE_COALESCE_BYTES, and send a comment frame after SSE_HEARTBEAT_SECONDS idle
+SSE_COALESCE_INTERVAL = float(os.getenv("SSE_COALESCE_MS", "20")) / 1000
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "1024"))
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
 
 def to_jsonable(obj):
     if isinstance(obj, datetime):
@@ -28,98 +40,203 @@ def to_jsonable(obj):
     return obj
 
 
+def wire_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop server-side bookkeeping the client already received as deltas"""
+    return {k: v for k, v in metadata.items() if k not in ("full_response", "artifacts")}
+
+
+async def seed_session_history(request: ChatRequest) -> None:
+    """Adopt client-sent history for sessions the server has no record of"""
+    history = [msg.model_dump() for msg in request.conversation_history or []]
+    # Drop the in-progress turn the client may have appended already
+    while history and history[-1]["role"] == "assistant" and not history[-1]["content"]:
+        history.pop()
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == request.message:
+        history.pop()
+    if history:
+        await memory_service.seed_history(request.session_id, history)
+
+
+def prompt_messages(conversation_history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Stored history as model messages; created_at lets the context builder skip turns it already summarized"""
+    return [
+        {"role": msg.get("role"), "content": msg.get("content"), "created_at": msg.get("created_at")}
+        for msg in conversation_history
+    ]
+
+
+async def require_known_session(request: ChatRequest) -> None:
+    """Refuse a history-less turn for a session the server has lost (restart, eviction, other worker)"""
+    if request.expect_history and not request.conversation_history and not await memory_service.has_history(request.session_id):
+        raise HTTPException(status_code=409, detail="Unknown session; resend with conversation_history")
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "*",
+}
+
+
+def parse_event_id(value: str | None) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def stream_response(stream: ReplayStream, last_event_id: int = 0) -> StreamingResponse:
+    """Serve a replay stream from last_event_id onward, with idle heartbeats"""
+    async def tail():
+        async for frame in stream.subscribe(last_event_id, heartbeat=SSE_HEARTBEAT_INTERVAL):
+            yield SSEEncoder.heartbeat() if frame is None else frame
+    return StreamingResponse(tail(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.post("/stream")
-async def stream_chat(request: ChatRequest, x_gemini_api_key: str | None = Header(default=None)):
-    """Stream chat responses using Server-Sent Events"""
+async def stream_chat(
+    request: ChatRequest,
+    x_gemini_api_key: str | None = Header(default=None),
+    last_event_id: str | None = Header(default=None),
+):
+    """Stream chat responses using Server-Sent Events.
+
+    A request carrying Last-Event-ID resumes the session's live or recently
+    finished generation instead of starting a new one, and gets a 404 when
+    there is none left to resume (the turn is not re-asked behind its back).
+    A request with expect_history for a session the server does not hold
+    gets a 409, so the client can resend it with its conversation_history.
+    """
+    
+    if last_event_id is not None:
+        stream = await stream_registry.get(request.session_id)
+        if stream is None:
+            raise HTTPException(status_code=404, detail="No active stream for this session")
+        return stream_response(stream, parse_event_id(last_event_id))
+    
+    await require_known_session(request)
     
     try:
-        # Add user message to memory (best-effort)
-        memory_service.add_message(
+        await seed_session_history(request)
+        
+        # Add user message to memory
+        await memory_service.add_message(
             request.session_id, 
             "user", 
             request.message
         )
         
         # Get conversation history
-        conversation_history = memory_service.get_conversation_history(request.session_id)
+        conversation_history = await memory_service.get_conversation_history(request.session_id)
         
         # Build messages for model
-        messages = []
-        for msg in conversation_history:
-            messages.append({
-                "role": msg.get("role"),
-                "content": msg.get("content"),
-            })
+        messages = prompt_messages(conversation_history)
         # Fallback: ensure at least the current user message is sent
         if not messages:
             messages = [{"role": "user", "content": request.message}]
         
-        async def generate_stream():
+        # Detected once per request; the metrics label and the service share it
+        language = gemini_service.detect_language(messages)
+        encoder = SSEEncoder()
+        
+        async def generate_frames():
+            # Runs detached from the HTTP connection; frames land in the replay buffer
+            timer = StreamTimer("/api/chat/stream", language)
+            chunks = gemini_service.generate_response_stream(
+                messages, api_key=x_gemini_api_key, session_id=request.session_id, language=language
+            )
             try:
-                async for chunk in gemini_service.generate_response_stream(messages, api_key=x_gemini_api_key):
-                    chunk_data = {
-                        "delta": chunk.delta,
-                        "done": chunk.done,
-                        "artifact_detected": chunk.artifact_detected,
-                        "artifact_data": to_jsonable(chunk.artifact_data) if chunk.artifact_data else None,
-                        "metadata": to_jsonable(chunk.metadata) if chunk.metadata else None,
-                    }
-                    yield f"data: {json.dumps(chunk_data)}\n\n"
-                    if chunk.done:
-                        if chunk.metadata and "full_response" in chunk.metadata:
-                            memory_service.add_message(
+                async for chunk in coalesce_chunks(
+                    chunks,
+                    interval=SSE_COALESCE_INTERVAL,
+                    max_bytes=SSE_COALESCE_BYTES,
+                    heartbeat=None,
+                ):
+                    if chunk.done and chunk.metadata:
+                        frame = encoder.encode(chunk.model_copy(update={"metadata": wire_metadata(chunk.metadata)}))
+                        if "full_response" in chunk.metadata:
+                            await memory_service.add_message(
                                 request.session_id,
                                 "assistant",
                                 chunk.metadata["full_response"]
                             )
-                        if chunk.metadata and "artifacts" in chunk.metadata:
-                            for artifact in chunk.metadata["artifacts"]:
-                                try:
-                                    memory_service.add_artifact(
-                                        request.session_id,
-                                        to_jsonable(artifact)
-                                    )
-                                except Exception:
-                                    pass
+                        for artifact in chunk.metadata.get("artifacts", []):
+                            try:
+                                await memory_service.add_artifact(
+                                    request.session_id,
+                                    to_jsonable(artifact)
+                                )
+                            except Exception:
+                                pass
+                    else:
+                        frame = encoder.encode(chunk)
+                    timer.token(chunk.delta)
+                    if chunk.done:
+                        metadata = chunk.metadata or {}
+                        timer.finish("error" if "error" in metadata else "cached" if metadata.get("cached") else "ok")
+                    yield encoder.last_id, frame
+                    if chunk.done:
                         break
             except Exception as e:
-                error_data = {"delta": f"Error: {str(e)}", "done": True, "error": str(e)}
-                yield f"data: {json.dumps(error_data)}\n\n"
+                timer.finish("error")
+                frame = encoder.encode(StreamChunk(delta=f"Error: {str(e)}", done=True, metadata={"error": str(e)}))
+                yield encoder.last_id, frame
+            finally:
+                timer.finish("aborted")
         
-        return StreamingResponse(
-            generate_stream(),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "*",
-            }
-        )
+        def closing_frame():
+            frame = encoder.encode(StreamChunk(
+                delta="",
+                done=True,
+                metadata={"error": "Generation cancelled after the client disconnected", "cancelled": True}
+            ))
+            return encoder.last_id, frame
+        
+        stream = stream_registry.start(request.session_id, generate_frames(), closing_frame)
+        return stream_response(stream)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stream/{session_id}")
+async def resume_stream(session_id: str, last_event_id: str | None = Header(default=None)):
+    """Resume a session's generation (EventSource-compatible reconnect)"""
+    stream = await stream_registry.get(session_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="No active stream for this session")
+    return stream_response(stream, parse_event_id(last_event_id))
+
+
+@router.delete("/session/{session_id}")
+async def clear_session(session_id: str):
+    """Forget a session's server-side history, e.g. when the user clears the chat"""
+    await memory_service.clear_session(session_id)
+    gemini_service.context_builder.forget(session_id)
+    return {"session_id": session_id, "cleared": True}
+
+
 @router.post("/message", response_model=ChatResponse)
 async def send_message(request: ChatRequest, x_gemini_api_key: str | None = Header(default=None)):
     """Send a message and get a non-streaming response"""
     
+    await require_known_session(request)
+    
     try:
-        memory_service.add_message(request.session_id, "user", request.message)
-        conversation_history = memory_service.get_conversation_history(request.session_id)
+        await seed_session_history(request)
+        await memory_service.add_message(request.session_id, "user", request.message)
+        conversation_history = await memory_service.get_conversation_history(request.session_id)
         
-        messages = []
-        for msg in conversation_history:
-            messages.append({
-                "role": msg.get("role"),
-                "content": msg.get("content"),
-            })
+        messages = prompt_messages(conversation_history)
         if not messages:
             messages = [{"role": "user", "content": request.message}]
         
-        result = await gemini_service.generate_response(messages, api_key=x_gemini_api_key)
-        memory_service.add_message(request.session_id, "assistant", result["content"])
+        result = await gemini_service.generate_response(
+            messages, api_key=x_gemini_api_key, session_id=request.session_id
+        )
+        await memory_service.add_message(request.session_id, "assistant", result["content"])
         
         response = ChatResponse(
             content=result["content"],
@@ -135,13 +252,98 @@ async def send_message(request: ChatRequest, x_gemini_api_key: str | None = Head
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def admit_sandbox(session_id: str) -> Ticket:
+    """Wait for a sandbox slot, turning a full or timed-out queue into a 429"""
+    try:
+        return await sandbox_admission.acquire(session_id)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+
 @router.post("/sandbox/execute", response_model=SandboxResponse)
 async def execute_code(request: SandboxRequest):
+    # A cached result never reaches the provider, so it doesn't wait for a slot
+    cached = await sandbox_service.cached_response(request)
+    if cached is not None:
+        return cached
+    ticket = await admit_sandbox(request.session_id)
     try:
         result = await sandbox_service.execute_code(request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        ticket.release()
+
+
+@router.post("/sandbox/execute/stream")
+async def execute_code_stream(request: SandboxRequest):
+    """Push stdout/stderr lines as they appear, then a final result event"""
+    cached = await sandbox_service.cached_response(request)
+    if cached is not None:
+        async def replay():
+            yield b"event: result\ndata: %s\n\n" % dumps(cached.model_dump(mode="json"))
+        return StreamingResponse(replay(), media_type="text/event-stream", headers=SSE_HEADERS)
+    ticket = await admit_sandbox(request.session_id)
+    
+    async def events():
+        try:
+            async for event, data in sandbox_service.stream_code(request):
+                payload = data.model_dump(mode="json") if event == "result" else {"line": data}
+                yield b"event: %s\ndata: %s\n\n" % (event.encode(), dumps(payload))
+        finally:
+            ticket.release()
+    
+    # The background task also frees the slot if the client leaves before streaming starts
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+        background=BackgroundTask(ticket.release),
+    )
+
+
+@router.post("/sandbox/batch")
+async def execute_batch(request: BatchRequest):
+    """Run several jobs in parallel, streaming each result as it completes"""
+    if not request.jobs:
+        raise HTTPException(status_code=400, detail="No jobs to run")
+    if len(request.jobs) > sandbox_service.batch_max_jobs:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {sandbox_service.batch_max_jobs} jobs"
+        )
+    ticket = await admit_sandbox(request.session_id)
+    
+    async def events():
+        started = time.perf_counter()
+        succeeded = 0
+        try:
+            async for index, response, elapsed in sandbox_service.execute_batch(request, ticket):
+                succeeded += response.success
+                payload = {"index": index, "elapsed": elapsed, **response.model_dump(mode="json")}
+                yield b"event: job\ndata: %s\n\n" % dumps(payload)
+            summary = {
+                "jobs": len(request.jobs),
+                "succeeded": succeeded,
+                "failed": len(request.jobs) - succeeded,
+                "total_time": time.perf_counter() - started,
+            }
+            yield b"event: done\ndata: %s\n\n" % dumps(summary)
+        finally:
+            ticket.release()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+        background=BackgroundTask(ticket.release),
+    )
+
+
+@router.get("/sandbox/stats")
+async def sandbox_stats():
+    return {**sandbox_service.stats(), "admission": sandbox_admission.stats()}
 
 
 @router.get("/health")
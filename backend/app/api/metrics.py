@@ -0,0 +1,135 @@
+import time
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.services.admission import sandbox_admission
+from app.services.gemini_service import gemini_service
+from app.services.metrics import HTTP_REQUEST_SECONDS, REGISTRY
+from app.services.sandbox_service import sandbox_service
+
+router = APIRouter(tags=["metrics"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request until its body completes, labelled by route template.
+
+    Plain ASGI rather than BaseHTTPMiddleware so streamed responses are not
+    buffered; unmatched paths share one label to keep cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                getattr(route, "path", "unmatched"), scope["method"], status
+            ).observe(time.perf_counter() - started)
+
+
+def collect_service_stats():
+    """Cache, pool, context, single-flight and sandbox admission counters the services already keep"""
+    responses = gemini_service.response_cache.stats()
+    yield "response_cache_lookups_total", "counter", "Response cache lookups", [({}, responses["lookups"])]
+    yield "response_cache_hits_total", "counter", "Response cache hits", [
+        ({"kind": "exact"}, responses["exact_hits"]),
+        ({"kind": "semantic"}, responses["semantic_hits"]),
+    ]
+    yield "response_cache_entries", "gauge", "Cached responses held by this worker", [({}, responses["entries"]["size"])]
+
+    flights = gemini_service.single_flight.stats()
+    yield "chat_upstream_calls_total", "counter", "Generations sent upstream", [({}, flights["upstream_calls"])]
+    yield "chat_coalesced_requests_total", "counter", "Requests served by joining an identical generation", [
+        ({}, flights["coalesced_requests"])
+    ]
+
+    upstream = gemini_service.upstream_stats()
+    yield "gemini_retries_total", "counter", "Upstream requests retried before the first token", [({}, upstream["retries"])]
+    yield "gemini_rate_limited_total", "counter", "Requests delayed or rejected by the per-key rate limit", [
+        ({"result": "throttled"}, upstream["rate_limit"]["throttled"]),
+        ({"result": "rejected"}, upstream["rate_limit"]["rejected"]),
+    ]
+    yield "gemini_hedges_total", "counter", "Hedged duplicate requests sent", [({}, upstream["hedging"]["hedges"])]
+    yield "gemini_hedge_wins_total", "counter", "Hedged requests that streamed first", [({}, upstream["hedging"]["hedge_wins"])]
+
+    pools = gemini_service.pool_stats()
+    yield "gemini_pool_requests_total", "counter", "Per-key SDK client and model pool lookups", [
+        ({"pool": pool, "result": result}, pools[pool][key])
+        for pool in ("clients", "models")
+        for result, key in (("hit", "hits"), ("miss", "misses"))
+    ]
+    yield "gemini_pool_entries", "gauge", "Pooled SDK clients and models", [
+        ({"pool": pool}, pools[pool]["size"]) for pool in ("clients", "models")
+    ]
+
+    context = gemini_service.context_builder.stats()
+    yield "context_builds_total", "counter", "Prompts assembled by the context builder", [({}, context["requests"])]
+    yield "context_prompt_tokens_total", "counter", "Estimated prompt tokens of the full history", [
+        ({}, context["prompt_tokens_unbounded_total"])
+    ]
+    yield "context_prompt_tokens_saved_total", "counter", "Estimated prompt tokens trimmed or summarised away", [
+        ({}, context["prompt_tokens_saved_total"])
+    ]
+    yield "context_summary_cache_requests_total", "counter", "History summary cache lookups", [
+        ({"result": "hit"}, context["summaries"]["hits"]),
+        ({"result": "miss"}, context["summaries"]["misses"]),
+    ]
+
+    routing = gemini_service.router.stats()
+    routes = routing["routes"]
+    yield "model_route_requests_total", "counter", "Generations attempted per model route", [
+        ({"route": name, "result": "ok"}, route["requests"] - route["failures"]) for name, route in routes.items()
+    ] + [({"route": name, "result": "error"}, route["failures"]) for name, route in routes.items()]
+    yield "model_route_latency_seconds", "gauge", "EWMA time to first token per model route", [
+        ({"route": name}, route["latency"]) for name, route in routes.items() if route["latency"] is not None
+    ]
+    yield "model_route_error_rate", "gauge", "EWMA error rate per model route", [
+        ({"route": name}, route["error_rate"]) for name, route in routes.items()
+    ]
+    yield "model_route_fallbacks_total", "counter", "Generations retried on the next model route", [
+        ({}, routing["fallbacks"])
+    ]
+
+    results = sandbox_service.result_cache
+    if results is not None:
+        stats = results.stats()
+        yield "sandbox_result_cache_requests_total", "counter", "Sandbox result cache lookups", [
+            ({"result": "hit"}, stats["hits"]),
+            ({"result": "miss"}, stats["misses"]),
+        ]
+        yield "sandbox_result_cache_entries", "gauge", "Cached sandbox results", [({}, stats["size"])]
+
+    admission = sandbox_admission.stats()
+    yield "sandbox_active", "gauge", "Sandbox executions holding a slot", [({}, admission["active"])]
+    yield "sandbox_queue_depth", "gauge", "Sandbox executions waiting for a slot", [({}, admission["queue_depth"])]
+    yield "sandbox_admitted_total", "counter", "Sandbox executions admitted", [({}, admission["admitted"])]
+    yield "sandbox_rejected_total", "counter", "Sandbox executions rejected", [
+        ({"reason": "queue_full"}, admission["rejected_queue_full"]),
+        ({"reason": "timeout"}, admission["rejected_timeout"]),
+    ]
+
+
+REGISTRY.register_collector(collect_service_stats)
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (values are per worker process)"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
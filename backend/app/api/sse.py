@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+from app.models.chat import StreamChunk
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+    import json
+
+
+# Yielded by coalesce_chunks when the stream has been idle for the heartbeat interval
+HEARTBEAT = None
+
+COALESCABLE_EVENTS = ("delta", "artifact_delta")
+
+
+def dumps(data: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+class SSEEncoder:
+    """Encodes StreamChunks as compact text/event-stream frames with sequential ids"""
+
+    def __init__(self, start_id: int = 0):
+        self.last_id = start_id
+
+    def encode(self, chunk: StreamChunk) -> bytes:
+        self.last_id += 1
+        data = chunk.model_dump(mode="json", exclude_defaults=True, exclude={"event"})
+        if not data.get("delta"):
+            data.pop("delta", None)
+        event = b"" if chunk.event == "delta" else b"event: " + chunk.event.encode() + b"\n"
+        return b"id: %d\n%sdata: %s\n\n" % (self.last_id, event, dumps(data))
+
+    @staticmethod
+    def heartbeat() -> bytes:
+        return b": ping\n\n"
+
+
+def _mergeable(chunk: StreamChunk) -> bool:
+    return (
+        chunk.event in COALESCABLE_EVENTS
+        and not chunk.done
+        and chunk.metadata is None
+        and chunk.artifact_data is None
+        and not chunk.artifact_detected
+    )
+
+
+async def coalesce_chunks(
+    source: AsyncIterator[StreamChunk],
+    interval: float = 0.02,
+    max_bytes: int = 1024,
+    heartbeat: Optional[float] = 15.0,
+) -> AsyncGenerator[Optional[StreamChunk], None]:
+    """Merge runs of small deltas into frames bounded by time and size.
+
+    Consecutive text (or same-artifact code) deltas are held for at most
+    ``interval`` seconds or ``max_bytes`` characters. ``HEARTBEAT`` is yielded
+    whenever the source has been silent for ``heartbeat`` seconds (never if None).
+    """
+    iterator = source.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    held: Optional[StreamChunk] = None
+    parts: list = []
+    size = 0
+    held_since = 0.0
+
+    def flush() -> StreamChunk:
+        nonlocal held, parts, size
+        chunk = held.model_copy(update={"delta": "".join(parts)}) if len(parts) > 1 else held
+        held, parts, size = None, [], 0
+        return chunk
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = heartbeat if held is None else max(0.0, held_since + interval - time.monotonic())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                if held is not None:
+                    yield flush()
+                else:
+                    yield HEARTBEAT
+                continue
+
+            future, pending = pending, None
+            try:
+                chunk = future.result()
+            except StopAsyncIteration:
+                if held is not None:
+                    yield flush()
+                return
+
+            if held is not None and (
+                not _mergeable(chunk)
+                or chunk.event != held.event
+                or chunk.artifact_id != held.artifact_id
+            ):
+                yield flush()
+
+            if interval <= 0 or not _mergeable(chunk):
+                yield chunk
+                continue
+
+            if held is None:
+                held, held_since = chunk, time.monotonic()
+            parts.append(chunk.delta)
+            size += len(chunk.delta)
+            if size >= max_bytes:
+                yield flush()
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
@@ -1,17 +1,44 @@
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from dotenv import load_dotenv
 import os
-from app.api.chat import router as chat_router
 
-# Load environment variables
+# Load environment variables before the services read their configuration
 load_dotenv()
 
+from app.api.chat import router as chat_router
+from app.api.metrics import MetricsMiddleware, router as metrics_router
+from app.services.gemini_service import gemini_service
+from app.services.sandbox_service import sandbox_service
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Process-wide resources shared by all requests
+    await sandbox_service.start()
+    print(f"Startup: app imported in {IMPORT_SECONDS * 1000:.0f}ms")
+    # Import the Gemini SDK in the background so /health answers immediately
+    if os.getenv("GEMINI_WARMUP", "1") not in ("0", "false", "False"):
+        asyncio.get_running_loop().run_in_executor(None, gemini_service.warmup)
+    yield
+    await sandbox_service.close()
+    await gemini_service.close()
+
+
 app = FastAPI(
     title="AI Coding Agent API",
     description="Backend API for Claude-style AI Coding Agent",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS - Allow all origins for now to fix CORS issues
@@ -23,9 +50,10 @@ app.add_middleware(
     allow_origins=cors_origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["content-type", "x-gemini-api-key", "x-e2b-api-key", "authorization"],
+    allow_headers=["content-type", "x-gemini-api-key", "x-e2b-api-key", "authorization", "last-event-id"],
     expose_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Add manual CORS handler for preflight requests
 @app.options("/api/chat/stream")
@@ -35,7 +63,7 @@ async def options_handler():
         headers={
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "content-type, x-gemini-api-key, x-e2b-api-key",
+            "Access-Control-Allow-Headers": "content-type, x-gemini-api-key, x-e2b-api-key, last-event-id",
             "Access-Control-Allow-Credentials": "true",
             "Access-Control-Max-Age": "600",
         }
@@ -48,7 +76,7 @@ async def options_sandbox_handler():
         headers={
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "content-type, x-gemini-api-key, x-e2b-api-key",
+            "Access-Control-Allow-Headers": "content-type, x-gemini-api-key, x-e2b-api-key, last-event-id",
             "Access-Control-Allow-Credentials": "true",
             "Access-Control-Max-Age": "600",
         }
@@ -56,6 +84,7 @@ async def options_sandbox_handler():
 
 # Mount routers
 app.include_router(chat_router)
+app.include_router(metrics_router)
 
 @app.get("/")
 async def root():
@@ -15,6 +15,9 @@ class ChatRequest(BaseModel):
     message: str
     session_id: str
     conversation_history: Optional[List[ChatMessage]] = []
+    # Set by clients that send only the new turn: a session the server no
+    # longer holds is then answered with 409 so the history can be resent
+    expect_history: bool = False
 
 
 class CodeArtifact(BaseModel):
@@ -44,6 +47,8 @@ class StreamChunk(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
     artifact_detected: bool = False
     artifact_data: Optional[CodeArtifact] = None
+    event: str = "delta"  # "delta", "artifact_start", "artifact_delta" or "artifact_end"
+    artifact_id: Optional[str] = None
 
 
 class SandboxRequest(BaseModel):
@@ -51,6 +56,8 @@ class SandboxRequest(BaseModel):
     code: str
     language: str
     session_id: str
+    stdin: Optional[str] = None
+    bypass_cache: bool = False  # Re-run even if an identical execution is cached
 
 
 class SandboxResponse(BaseModel):
@@ -59,3 +66,18 @@ class SandboxResponse(BaseModel):
     error: Optional[str] = None
     execution_time: Optional[float] = None
     success: bool = True
+    cached: bool = False
+
+
+class BatchJob(BaseModel):
+    """One program/input pair in a batch execution"""
+    code: str
+    language: str
+    stdin: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    """Request model for running several jobs in one call"""
+    session_id: str
+    jobs: List[BatchJob]
+    bypass_cache: bool = False
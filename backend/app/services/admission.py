@@ -0,0 +1,186 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request's slot; release() is idempotent"""
+
+    def __init__(self, controller: "AdmissionController", session_id: str):
+        self.controller = controller
+        self.session_id = session_id
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """Global and per-session concurrency limits in front of the sandbox provider.
+
+    Requests over either limit wait in per-session queues served round-robin,
+    so one busy session cannot starve the others. Arrivals beyond
+    ``max_queue`` waiters, or waiting longer than ``queue_timeout``, are
+    rejected with a Retry-After estimate from the recent hold time.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        per_session: int = 2,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_session = per_session
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.active_by_session: Dict[str, int] = {}
+        self.queues: "OrderedDict[str, Deque[Tuple[float, asyncio.Future]]]" = OrderedDict()
+        self.waiting = 0
+        self.hold_time = 1.0  # EWMA of seconds a slot is held
+        self.wait_times: Deque[float] = deque(maxlen=1024)
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.max_depth = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrent=int(os.getenv("SANDBOX_MAX_CONCURRENT", "8")),
+            per_session=int(os.getenv("SANDBOX_MAX_PER_SESSION", "2")),
+            max_queue=int(os.getenv("SANDBOX_QUEUE_DEPTH", "64")),
+            queue_timeout=float(os.getenv("SANDBOX_QUEUE_TIMEOUT", "10")),
+        )
+
+    def _can_admit(self, session_id: str) -> bool:
+        return self.active < self.max_concurrent and self.active_by_session.get(session_id, 0) < self.per_session
+
+    def _admit(self, session_id: str, waited: float) -> Ticket:
+        self.active += 1
+        self.active_by_session[session_id] = self.active_by_session.get(session_id, 0) + 1
+        self.admitted += 1
+        self.wait_times.append(waited)
+        return Ticket(self, session_id)
+
+    def retry_after(self) -> int:
+        # Time for the slots to drain the queue ahead of a new arrival
+        return max(1, math.ceil(self.hold_time * (self.waiting + 1) / self.max_concurrent))
+
+    async def acquire(self, session_id: str) -> Ticket:
+        """Wait for a slot; raises AdmissionRejected when the queue is full or the wait times out"""
+        if self.waiting == 0 and self._can_admit(session_id):
+            return self._admit(session_id, 0.0)
+        if self.waiting >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected("Sandbox queue is full", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(session_id, deque()).append((time.monotonic(), future))
+        self.waiting += 1
+        self.max_depth = max(self.max_depth, self.waiting)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._abandon(session_id, future)
+                self.rejected_timeout += 1
+                raise AdmissionRejected("Timed out waiting for a sandbox slot", self.retry_after())
+        except asyncio.CancelledError:
+            if future.done():
+                # Admitted just as the caller went away: hand the slot back
+                future.result().release()
+            else:
+                self._abandon(session_id, future)
+            raise
+        return future.result()
+
+    def try_acquire(self, session_id: str) -> Optional[Ticket]:
+        """A slot right away if one is free and nobody is queued ahead, else None"""
+        if self.waiting == 0 and self._can_admit(session_id):
+            return self._admit(session_id, 0.0)
+        return None
+
+    @asynccontextmanager
+    async def slot(self, session_id: str) -> AsyncIterator[Ticket]:
+        ticket = await self.acquire(session_id)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def _abandon(self, session_id: str, future: asyncio.Future) -> None:
+        future.cancel()
+        queue = self.queues.get(session_id)
+        for entry in queue or ():
+            if entry[1] is future:
+                queue.remove(entry)
+                self.waiting -= 1
+                if not queue:
+                    del self.queues[session_id]
+                return
+
+    def _release(self, ticket: Ticket) -> None:
+        held = time.monotonic() - ticket.admitted_at
+        self.hold_time = 0.8 * self.hold_time + 0.2 * held
+        self.active -= 1
+        remaining = self.active_by_session.get(ticket.session_id, 1) - 1
+        if remaining:
+            self.active_by_session[ticket.session_id] = remaining
+        else:
+            self.active_by_session.pop(ticket.session_id, None)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit waiters in session round-robin order while slots are free"""
+        while self.queues and self.active < self.max_concurrent:
+            for session_id in self.queues:
+                if self._can_admit(session_id):
+                    break
+            else:
+                return
+            queue = self.queues[session_id]
+            enqueued_at, future = queue.popleft()
+            self.waiting -= 1
+            if queue:
+                self.queues.move_to_end(session_id)
+            else:
+                del self.queues[session_id]
+            future.set_result(self._admit(session_id, time.monotonic() - enqueued_at))
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.wait_times)
+        return {
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_depth,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+
+# Global instance
+sandbox_admission = AdmissionController.from_env()
@@ -0,0 +1,161 @@
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from app.models.chat import CodeArtifact
+
+
+OPEN_TAG = "<artifact"
+CLOSE_TAG = "</artifact>"
+ATTR_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+TEXT = "text"
+ARTIFACT_START = "artifact_start"
+ARTIFACT_DELTA = "artifact_delta"
+ARTIFACT_END = "artifact_end"
+
+
+@dataclass(slots=True)
+class ArtifactEvent:
+    """One event produced by ArtifactStreamParser"""
+    kind: str
+    text: str = ""
+    attrs: Dict[str, str] = field(default_factory=dict)
+    artifact: Optional[CodeArtifact] = None
+    artifact_id: Optional[str] = None
+
+
+def _partial_suffix(buffer: str, tag: str) -> int:
+    """Length of the longest suffix of buffer that is a proper prefix of tag"""
+    start = max(0, len(buffer) - len(tag) + 1)
+    index = buffer.find("<", start)
+    while index != -1:
+        if tag.startswith(buffer[index:]):
+            return len(buffer) - index
+        index = buffer.find("<", index + 1)
+    return 0
+
+
+class ArtifactStreamParser:
+    """Incremental tokenizer for <artifact ...>...</artifact> blocks.
+
+    Each chunk is scanned once; only a tail that could be the start of a tag
+    is carried over to the next chunk, so tags split across chunks are handled
+    and total work stays linear in the response length.
+    """
+
+    _IN_TEXT = 0
+    _IN_OPEN_TAG = 1
+    _IN_BODY = 2
+
+    def __init__(self):
+        self._state = self._IN_TEXT
+        self._pending = ""
+        self._tag_parts: List[str] = []
+        self._body_parts: List[str] = []
+        self._attrs: Dict[str, str] = {}
+        self._artifact_id: Optional[str] = None
+        self.artifacts: List[CodeArtifact] = []
+
+    def feed(self, chunk: str) -> List[ArtifactEvent]:
+        events: List[ArtifactEvent] = []
+        buffer = self._pending + chunk
+        self._pending = ""
+        pos = 0
+        while pos < len(buffer):
+            if self._state == self._IN_TEXT:
+                start = buffer.find(OPEN_TAG, pos)
+                if start == -1:
+                    keep = _partial_suffix(buffer[pos:], OPEN_TAG)
+                    end = len(buffer) - keep
+                    if end > pos:
+                        events.append(ArtifactEvent(TEXT, text=buffer[pos:end]))
+                    self._pending = buffer[end:]
+                    return events
+                after = start + len(OPEN_TAG)
+                if after == len(buffer):
+                    # Can't tell "<artifact ..." from "<artifacts" until the next character arrives
+                    if start > pos:
+                        events.append(ArtifactEvent(TEXT, text=buffer[pos:start]))
+                    self._pending = buffer[start:]
+                    return events
+                if not (buffer[after].isspace() or buffer[after] == ">"):
+                    # Some other word, e.g. "<artifacts>" or "<artifactory"
+                    events.append(ArtifactEvent(TEXT, text=buffer[pos:after]))
+                    pos = after
+                    continue
+                if start > pos:
+                    events.append(ArtifactEvent(TEXT, text=buffer[pos:start]))
+                self._state = self._IN_OPEN_TAG
+                self._tag_parts = []
+                pos = start
+            elif self._state == self._IN_OPEN_TAG:
+                close = buffer.find(">", pos)
+                if close == -1:
+                    self._tag_parts.append(buffer[pos:])
+                    return events
+                self._tag_parts.append(buffer[pos:close + 1])
+                self._attrs = dict(ATTR_PATTERN.findall("".join(self._tag_parts)))
+                self._artifact_id = str(uuid.uuid4())
+                self._body_parts = []
+                self._state = self._IN_BODY
+                events.append(ArtifactEvent(ARTIFACT_START, attrs=self._attrs, artifact_id=self._artifact_id))
+                pos = close + 1
+            else:
+                end = buffer.find(CLOSE_TAG, pos)
+                if end == -1:
+                    keep = _partial_suffix(buffer[pos:], CLOSE_TAG)
+                    stop = len(buffer) - keep
+                    if stop > pos:
+                        self._body_parts.append(buffer[pos:stop])
+                        events.append(ArtifactEvent(ARTIFACT_DELTA, text=buffer[pos:stop], artifact_id=self._artifact_id))
+                    self._pending = buffer[stop:]
+                    return events
+                if end > pos:
+                    self._body_parts.append(buffer[pos:end])
+                    events.append(ArtifactEvent(ARTIFACT_DELTA, text=buffer[pos:end], artifact_id=self._artifact_id))
+                events.append(self._close_artifact())
+                pos = end + len(CLOSE_TAG)
+        return events
+
+    def _close_artifact(self) -> ArtifactEvent:
+        artifact = None
+        if self._attrs.get("type", "code") == "code":
+            artifact = CodeArtifact(
+                id=self._artifact_id,
+                language=self._attrs.get("language", "text"),
+                title=self._attrs.get("title", "Code"),
+                code="".join(self._body_parts).strip(),
+            )
+            self.artifacts.append(artifact)
+        event = ArtifactEvent(ARTIFACT_END, attrs=self._attrs, artifact=artifact, artifact_id=self._artifact_id)
+        self._state = self._IN_TEXT
+        self._body_parts = []
+        self._attrs = {}
+        self._artifact_id = None
+        return event
+
+    def finish(self) -> List[ArtifactEvent]:
+        """Flush held-back text and close an artifact left open by a truncated response"""
+        events: List[ArtifactEvent] = []
+        if self._state == self._IN_TEXT and self._pending:
+            events.append(ArtifactEvent(TEXT, text=self._pending))
+        elif self._state == self._IN_OPEN_TAG:
+            # An opening tag cut off before its ">" is just text
+            events.append(ArtifactEvent(TEXT, text="".join(self._tag_parts)))
+        elif self._state == self._IN_BODY:
+            if self._pending:
+                self._body_parts.append(self._pending)
+                events.append(ArtifactEvent(ARTIFACT_DELTA, text=self._pending, artifact_id=self._artifact_id))
+            events.append(self._close_artifact())
+        self._state = self._IN_TEXT
+        self._pending = ""
+        return events
+
+    @classmethod
+    def extract(cls, content: str) -> List[CodeArtifact]:
+        """Parse a complete response and return its code artifacts"""
+        parser = cls()
+        parser.feed(content)
+        parser.finish()
+        return parser.artifacts
@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Thread-safe LRU cache with optional per-entry TTL and hit/miss counters.
+
+    When ``max_bytes`` is set, ``sizeof`` gives each value's size and least
+    recently used entries are evicted until the total fits. With a ``shared``
+    state backend, JSON-serializable values are written through under
+    ``namespace`` and local misses fall back to it, so worker processes share hits.
+    Shared writes are queued on the backend's thread; code on the event loop
+    should read with ``aget`` so a local miss doesn't block it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        shared: Any = None,
+        namespace: str = "cache",
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.shared = shared
+        self.namespace = namespace
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_hits = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value or None, refreshing its LRU position"""
+        value = self._get_local(key)
+        if value is None and self.shared is not None:
+            value = self._shared_hit(key, self.shared.get(f"{self.namespace}:{key}"))
+        return value
+
+    async def aget(self, key: Hashable) -> Any:
+        """``get`` for async callers: the shared fallback runs off the event loop"""
+        value = self._get_local(key)
+        if value is None and self.shared is not None:
+            value = self._shared_hit(key, await self.shared.call(self.shared.get, f"{self.namespace}:{key}"))
+        return value
+
+    def _shared_hit(self, key: Hashable, raw: Optional[bytes]) -> Any:
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        self._set_local(key, value)
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+            self.shared_hits += 1
+        return value
+
+    def _get_local(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.bytes -= size
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> bool:
+        """Store a value; returns False if it alone exceeds max_bytes"""
+        if not self._set_local(key, value):
+            return False
+        if self.shared is not None:
+            self.shared.post(self.shared.set, f"{self.namespace}:{key}", json.dumps(value).encode(), ttl=self.ttl)
+        return True
+
+    def _set_local(self, key: Hashable, value: Any) -> bool:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self._entries[key] = (value, expires_at, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return the cached value, building and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable) -> Any:
+        if self.shared is not None:
+            self.shared.post(self.shared.delete, f"{self.namespace}:{key}")
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self.bytes -= entry[2]
+            return entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "shared": self.shared is not None,
+            "shared_hits": self.shared_hits,
+        }
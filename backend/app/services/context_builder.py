@@ -0,0 +1,142 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.cache import TTLCache
+
+
+ARTIFACT_PATTERN = re.compile(r'<artifact([^>]*)>(.*?)(?:</artifact>|$)', re.DOTALL)
+FENCE_PATTERN = re.compile(r'```[^\n]*\n.*?(?:```|$)', re.DOTALL)
+ATTR_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def compact_message(content: str) -> str:
+    """Replace artifact bodies and fenced code with short references"""
+    def artifact_ref(match: re.Match) -> str:
+        attrs = dict(ATTR_PATTERN.findall(match.group(1)))
+        lines = match.group(2).strip().count("\n") + 1
+        return f'[artifact "{attrs.get("title", "untitled")}" ({attrs.get("language", "code")}), {lines} lines omitted]'
+
+    content = ARTIFACT_PATTERN.sub(artifact_ref, content)
+    return FENCE_PATTERN.sub("[code block omitted]", content)
+
+
+class ContextBuilder:
+    """Fits conversation history into a token budget.
+
+    The newest messages are kept verbatim (artifact bodies included for the last
+    ``keep_recent`` messages); older messages are compacted, and whatever still
+    does not fit is folded into a rolling per-session summary.
+    """
+
+    def __init__(self, token_budget: int = 8000, keep_recent: int = 4, summary_tokens: int = 500):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summary_tokens = summary_tokens
+        self.summaries = TTLCache(max_entries=10_000, ttl=3600)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_before_total = 0
+        self.tokens_saved_total = 0
+
+    @classmethod
+    def from_env(cls) -> "ContextBuilder":
+        return cls(
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000")),
+            keep_recent=int(os.getenv("CONTEXT_KEEP_RECENT", "4")),
+            summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "500")),
+        )
+
+    @staticmethod
+    def _summary_line(message: Dict[str, Any]) -> str:
+        text = " ".join(compact_message(message.get("content") or "").split())
+        if len(text) > 200:
+            text = text[:197] + "..."
+        return f"{message.get('role')}: {text}"
+
+    def _summarize(self, session_id: Optional[str], dropped: List[Dict[str, Any]]) -> str:
+        """Extend the cached rolling summary with newly dropped messages"""
+        lines: List[str] = []
+        last_seen = None
+        cached = self.summaries.get(session_id) if session_id else None
+        if cached:
+            last_seen, lines = cached
+            lines = list(lines)
+        for message in dropped:
+            created_at = message.get("created_at")
+            if last_seen is not None and created_at is not None and created_at <= last_seen:
+                continue
+            lines.append(self._summary_line(message))
+        # Keep the newest lines within the summary budget
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        if session_id and dropped:
+            self.summaries.set(session_id, (dropped[-1].get("created_at"), lines))
+        return "\n".join(lines)
+
+    def build(
+        self,
+        messages: List[Dict[str, Any]],
+        session_id: Optional[str] = None,
+        reserved_tokens: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Return the messages to send and token accounting for this request"""
+        tokens_before = reserved_tokens + sum(estimate_tokens(m.get("content") or "") for m in messages)
+        budget = max(0, self.token_budget - reserved_tokens)
+
+        recent_start = max(0, len(messages) - self.keep_recent)
+        contents: Dict[int, str] = {}
+
+        def fit(limit: int) -> int:
+            """Index of the oldest message kept when filling ``limit`` newest-first"""
+            used = 0
+            for index in range(len(messages) - 1, -1, -1):
+                if index not in contents:
+                    content = messages[index].get("content") or ""
+                    contents[index] = compact_message(content) if index < recent_start else content
+                cost = estimate_tokens(contents[index])
+                # The latest message is always sent, even if it alone exceeds the budget
+                if index < len(messages) - 1 and used + cost > limit:
+                    return index + 1
+                used += cost
+            return 0
+
+        # Room for the summary is only set aside when the history does not fit without one
+        cut = fit(budget)
+        if cut:
+            cut = fit(budget - self.summary_tokens)
+        kept = [{"role": messages[index].get("role"), "content": contents[index]} for index in range(cut, len(messages))]
+
+        if cut:
+            summary = self._summarize(session_id, messages[:cut])
+            kept.insert(0, {"role": "user", "content": f"Summary of the earlier conversation:\n{summary}"})
+
+        tokens_after = reserved_tokens + sum(estimate_tokens(m["content"]) for m in kept)
+        stats = {
+            "prompt_tokens": tokens_after,
+            "prompt_tokens_unbounded": tokens_before,
+            "prompt_tokens_saved": tokens_before - tokens_after,
+            "summarized_messages": cut,
+        }
+        with self._lock:
+            self.requests += 1
+            self.tokens_before_total += tokens_before
+            self.tokens_saved_total += tokens_before - tokens_after
+        return kept, stats
+
+    def forget(self, session_id: str) -> None:
+        """Drop the rolling summary of a cleared session"""
+        self.summaries.pop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens_unbounded_total": self.tokens_before_total,
+            "prompt_tokens_saved_total": self.tokens_saved_total,
+            "summaries": self.summaries.stats(),
+        }
@@ -1,9 +1,98 @@
-import google.generativeai as genai
+import asyncio
+import hashlib
+import json
 import os
 import re
-import uuid
+import threading
+import time
 from typing import AsyncGenerator, Dict, Any, List, Optional
 from app.models.chat import ChatMessage, CodeArtifact, StreamChunk
+from app.services.artifact_parser import (
+    ARTIFACT_DELTA,
+    ARTIFACT_END,
+    ARTIFACT_START,
+    TEXT,
+    ArtifactEvent,
+    ArtifactStreamParser,
+)
+from app.services.cache import TTLCache
+from app.services.context_builder import ContextBuilder, estimate_tokens
+from app.services.metrics import ARTIFACT_PARSE_SECONDS
+from app.services.model_router import ModelRoute, ModelRouter, is_upstream_failure
+from app.services.response_cache import ResponseCache, normalize_prompt
+from app.services.single_flight import SingleFlight
+from app.services.upstream import Hedger, RateLimiter, RetryPolicy
+
+
+# Default for language= when the caller has not run detect_language itself
+_DETECT = object()
+
+# Size of the slices a cached answer is replayed in
+REPLAY_CHUNK_CHARS = 256
+
+# Every name a prompt may use for a language, mapped to the canonical one
+LANGUAGE_ALIASES = {
+    "javascript": "javascript",
+    "js": "javascript",
+    "node": "javascript",
+    "node.js": "javascript",
+    "nodejs": "javascript",
+    "typescript": "typescript",
+    "ts": "typescript",
+    "java": "java",
+    "python": "python",
+    "python3": "python",
+    "c#": "csharp",
+    "csharp": "csharp",
+    "c++": "cpp",
+    "cpp": "cpp",
+    "go": "go",
+    "golang": "go",
+    "rust": "rust",
+    "php": "php",
+    "ruby": "ruby",
+    "kotlin": "kotlin",
+    "swift": "swift",
+}
+
+# Which language wins when a prompt names several and none is introduced by a cue word
+LANGUAGE_PRIORITY = (
+    "javascript", "typescript", "java", "python", "csharp", "cpp",
+    "go", "rust", "php", "ruby", "kotlin", "swift",
+)
+
+# One pass over the prompt for whole-word aliases (so "ts" doesn't match "tests");
+# the anchor and first-letter lookahead let the scan reject most positions cheaply
+_LANGUAGE_PATTERN = re.compile(
+    r"\b(?<![#+.])(?=[" + "".join(sorted({alias[0] for alias in LANGUAGE_ALIASES})) + r"])(?:"
+    + "|".join(re.escape(alias) for alias in sorted(LANGUAGE_ALIASES, key=len, reverse=True))
+    + r")(?![\w#+])",
+    re.IGNORECASE,
+)
+# A cue right before a name ("rewrite this in Rust") marks it as the target
+_LANGUAGE_CUE = re.compile(r"\b(?:in|into|to|using)\s+$", re.IGNORECASE)
+# An uncued "Go" opening a sentence is the verb ("Go ahead and ...")
+_SENTENCE_START = re.compile(r"(?:^|[.!?\n])[\s\"'(*-]*$")
+_CUE_WINDOW = 8
+_LANGUAGE_RANK = {language: rank for rank, language in enumerate(LANGUAGE_PRIORITY)}
+
+# The SDK takes about a second to import, so it is loaded on first use (or by warmup)
+_sdk_lock = threading.Lock()
+_genai = None
+_glm = None
+
+
+def load_sdk():
+    """Import google.generativeai once and return (genai, generativelanguage)"""
+    global _genai, _glm
+    if _genai is None:
+        with _sdk_lock:
+            if _genai is None:
+                from google.ai import generativelanguage
+                import google.generativeai
+                _glm = generativelanguage
+                _genai = google.generativeai
+    return _genai, _glm
 
 
 class GeminiService:
@@ -17,6 +106,31 @@ class GeminiService:
             "top_k": 40,
             "max_output_tokens": 4096,
         }
+        # Optional endpoint override; an http:// endpoint (e.g. a local fake server) is plaintext
+        self.api_endpoint = os.getenv("GEMINI_API_ENDPOINT")
+        
+        # Warm clients per API key and models per (key, system instruction), so
+        # requests never touch the SDK's process-global configuration.
+        cache_size = int(os.getenv("GEMINI_MODEL_CACHE_SIZE", "128"))
+        cache_ttl = float(os.getenv("GEMINI_MODEL_CACHE_TTL", "3600"))
+        self.client_pool = TTLCache(max_entries=cache_size, ttl=cache_ttl)
+        self.model_pool = TTLCache(max_entries=cache_size, ttl=cache_ttl)
+        
+        self.context_builder = ContextBuilder.from_env()
+        self.response_cache = ResponseCache.from_env()
+        # Key ids that have completed a live generation; only these are served cached
+        # answers, so an unknown or invalid key never gets output another key paid for
+        self.verified_keys = TTLCache(max_entries=cache_size, ttl=cache_ttl)
+        self.single_flight = SingleFlight()
+        
+        # Per-key request budget, retries before the first token, optional hedging
+        self.rate_limiter = RateLimiter.from_env()
+        self.retry_policy = RetryPolicy.from_env()
+        self.hedger = Hedger.from_env()
+        self.retries = 0
+        
+        # Which model (or OpenAI-compatible backend) serves a request, with fallback
+        self.router = ModelRouter.from_env(self.model_name)
         
         # Aggressive system prompt with LANGUAGE REQUIREMENT and bullet-only explanation
         self.system_prompt = (
@@ -35,49 +149,160 @@ class GeminiService:
             "- Also wrap the exact same code inside an <artifact> tag: <artifact type=\"code\" language=\"LANG\" title=\"TITLE\">...</artifact>.\n"
             "- Keep outputs runnable and on-topic."
         )
+        
+        # The system instruction for every target language (None: no guardrail), built
+        # once so model lookups and context budgeting reuse them
+        self.system_instructions = {
+            language: self.system_prompt + self._guardrail(language) for language in (None, *LANGUAGE_PRIORITY)
+        }
+        self.reserved_tokens = {
+            language: estimate_tokens(instruction) for language, instruction in self.system_instructions.items()
+        }
+        config = {"models": self.router.signature(), "system": self.system_prompt, **self.generation_config}
+        self.cache_config = {"fingerprint": hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()}
+
+    def _get_client(self, key: str, key_id: str):
+        """Build (or reuse) an async generative client bound to a single API key.
 
-    def _get_model(self, api_key: Optional[str], extra_instruction: Optional[str] = None):
+        Streams are read on the event loop through the SDK's grpc_asyncio
+        transport, so no thread is held per stream.
+        """
+        def create():
+            _, glm = load_sdk()
+            if self.api_endpoint and self.api_endpoint.startswith("http://"):
+                import grpc
+                from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+                    GenerativeServiceGrpcAsyncIOTransport,
+                )
+                channel = grpc.aio.insecure_channel(self.api_endpoint[len("http://"):])
+                return glm.GenerativeServiceAsyncClient(transport=GenerativeServiceGrpcAsyncIOTransport(channel=channel))
+            client_options = {"api_key": key}
+            if self.api_endpoint:
+                client_options["api_endpoint"] = self.api_endpoint
+            return glm.GenerativeServiceAsyncClient(client_options=client_options, transport="grpc_asyncio")
+        return self.client_pool.get_or_create(key_id, create)
+
+    @staticmethod
+    def _resolve_key(api_key: Optional[str]) -> tuple:
+        """(key, key id) for the request's key or the server default"""
         key = api_key or os.getenv("GEMINI_API_KEY")
         if not key:
             raise ValueError("Gemini API key not provided. Supply x-gemini-api-key header or set GEMINI_API_KEY env var.")
-        genai.configure(api_key=key)
-        system_instruction = self.system_prompt + (extra_instruction or "")
-        return genai.GenerativeModel(
-            model_name=self.model_name,
-            generation_config=self.generation_config,
-            system_instruction=system_instruction,
-        )
+        return key, hashlib.sha256(key.encode()).hexdigest()
+
+    def _get_model(
+        self,
+        api_key: Optional[str],
+        language: Optional[str] = None,
+        route: Optional[ModelRoute] = None,
+    ):
+        key, key_id = self._resolve_key(api_key)
+        system_instruction = self.system_instructions[language]
+        model_name = route.model if route is not None else self.model_name
+        overrides = route.generation_config if route is not None else {}
+
+        def create():
+            genai, _ = load_sdk()
+            model = genai.GenerativeModel(
+                model_name=model_name,
+                generation_config={**self.generation_config, **overrides},
+                system_instruction=system_instruction,
+            )
+            # Attach the per-key client instead of relying on genai.configure
+            model._async_client = self._get_client(key, key_id)
+            return model
+        # Routes may share a model name with different temperature or token limits
+        config = json.dumps(overrides, sort_keys=True) if overrides else ""
+        return self.model_pool.get_or_create((key_id, model_name, config, language), create)
+
+    async def _cached_response(self, key_id: str, cache_key: tuple) -> Optional[Dict[str, Any]]:
+        """Cached answer for cache_key, if this key has proven itself upstream"""
+        if self.verified_keys.get(key_id) is None:
+            return None
+        return await self.response_cache.lookup(*cache_key)
+
+    def warmup(self) -> None:
+        """Import the SDK ahead of the first request (run off the event loop)"""
+        load_sdk()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return {"clients": self.client_pool.stats(), "models": self.model_pool.stats()}
+
+    def upstream_stats(self) -> Dict[str, Any]:
+        return {"rate_limit": self.rate_limiter.stats(), "retries": self.retries, "hedging": self.hedger.stats()}
+
+    async def close(self) -> None:
+        await self.router.close()
 
     @staticmethod
-    def _detect_language_from_latest(messages: List[Dict[str, Any]]) -> Optional[str]:
+    def detect_language(messages: List[Dict[str, Any]]) -> Optional[str]:
+        """Canonical language named in the latest user message, if any.
+
+        A language introduced by "in", "into", "to" or "using" ("rewrite this
+        in Rust") is taken as the target; otherwise LANGUAGE_PRIORITY decides.
+        "go" is usually the verb, so it only counts when cued ("in Go", but not
+        "to go") or capitalized mid-sentence ("a Go program", not "Go ahead").
+        """
         for msg in reversed(messages):
             if msg.get("role") == "user":
-                text = (msg.get("content") or "").lower()
-                synonyms = {
-                    "js": "javascript",
-                    "node": "javascript",
-                    "node.js": "javascript",
-                    "nodejs": "javascript",
-                    "ts": "typescript",
-                }
-                for syn, canon in synonyms.items():
-                    if syn in text:
-                        return canon
-                for lang in ["javascript", "typescript", "java", "python", "c#", "c++", "go", "rust", "php", "ruby", "kotlin", "swift"]:
-                    if lang in text:
-                        return "csharp" if lang == "c#" else ("cpp" if lang == "c++" else lang)
-                return None
+                text = msg.get("content") or ""
+                best = None
+                for match in _LANGUAGE_PATTERN.finditer(text):
+                    name = match.group()
+                    language = LANGUAGE_ALIASES[name.lower()]
+                    start = match.start()
+                    cue = _LANGUAGE_CUE.search(text, max(0, start - _CUE_WINDOW), start)
+                    if name.lower() == "go" and (cue is None or cue.group().lower().startswith("to")):
+                        if name == "go" or _SENTENCE_START.search(text, max(0, start - _CUE_WINDOW), start):
+                            continue
+                    rank = (cue is None, _LANGUAGE_RANK[language])
+                    if best is None or rank < best[0]:
+                        best = (rank, language)
+                return best[1] if best else None
         return None
 
-    def _build_guardrail(self, messages: List[Dict[str, Any]]) -> str:
-        target_lang = self._detect_language_from_latest(messages)
-        if target_lang:
+    @staticmethod
+    def _guardrail(language: Optional[str]) -> str:
+        if language:
             return (
-                f"\n\nInstruction: The target language is '{target_lang}'. "
-                f"Answer only in {target_lang} with one fenced code block labeled {target_lang}."
+                f"\n\nInstruction: The target language is '{language}'. "
+                f"Answer only in {language} with one fenced code block labeled {language}."
             )
         return ""
 
+    def _build_context(
+        self,
+        messages: List[Dict[str, Any]],
+        language: Optional[str],
+        session_id: Optional[str],
+    ) -> tuple:
+        """Bound the history to the configured token budget"""
+        return self.context_builder.build(messages, session_id=session_id, reserved_tokens=self.reserved_tokens[language])
+
+    def _cache_key(self, messages: List[Dict[str, Any]], language: Optional[str]) -> tuple:
+        """(prompt, language, context hash, model config) identifying a cacheable answer"""
+        prompt = messages[-1].get("content") or "" if messages else ""
+        return (
+            prompt,
+            language,
+            ResponseCache.context_hash(messages),
+            self.cache_config,
+        )
+
+    async def _replay_cached(self, full_response: str) -> AsyncGenerator[StreamChunk, None]:
+        """Stream a cached answer with the same chunk shape as a live generation"""
+        parser = ArtifactStreamParser()
+        for start in range(0, len(full_response), REPLAY_CHUNK_CHARS):
+            for event in parser.feed(full_response[start:start + REPLAY_CHUNK_CHARS]):
+                yield self._chunk_for_event(event)
+        for event in parser.finish():
+            yield self._chunk_for_event(event)
+        yield StreamChunk(
+            delta="",
+            done=True,
+            metadata={"full_response": full_response, "artifacts": parser.artifacts, "cached": True},
+        )
+
     def _format_history(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         formatted: List[Dict[str, Any]] = []
         for msg in messages:
@@ -90,77 +315,234 @@ class GeminiService:
         self, 
         messages: List[Dict[str, Any]],
         api_key: Optional[str] = None,
+        session_id: Optional[str] = None,
+        language: Any = _DETECT,
+    ) -> AsyncGenerator[StreamChunk, None]:
+        try:
+            if language is _DETECT:
+                language = self.detect_language(messages)
+            cache_key = self._cache_key(messages, language)
+            _, key_id = self._resolve_key(api_key)
+            cached = await self._cached_response(key_id, cache_key)
+            if cached is not None:
+                async for chunk in self._replay_cached(cached["full_response"]):
+                    yield chunk
+                return
+            # Identical concurrent requests on the same API key share one upstream generation,
+            # so nobody is served a result (or a key error) produced with someone else's key
+            flight_key = (key_id, normalize_prompt(cache_key[0])) + cache_key[1:3]
+            generation = self.single_flight.run(
+                flight_key,
+                lambda: self._generate_live(api_key, key_id, messages, language, session_id, cache_key),
+            )
+            async for chunk in generation:
+                yield chunk
+        except Exception as e:
+            yield StreamChunk(delta=f"Error: {str(e)}", done=True, metadata={"error": str(e)})
+
+    async def _generate_live(
+        self,
+        api_key: Optional[str],
+        key_id: str,
+        messages: List[Dict[str, Any]],
+        language: Optional[str],
+        session_id: Optional[str],
+        cache_key: tuple,
     ) -> AsyncGenerator[StreamChunk, None]:
         try:
-            guardrail = self._build_guardrail(messages)
-            model = self._get_model(api_key, extra_instruction=guardrail)
-            contents = self._format_history(messages)
-            response = model.generate_content(contents, stream=True)
+            history, context_stats = self._build_context(messages, language, session_id)
+            contents = self._format_history(history)
             
-            full_response = ""
-            artifacts: List[CodeArtifact] = []
-            artifact_buffer = ""
-            in_artifact = False
+            response_parts: List[str] = []
+            parser = ArtifactStreamParser()
+            parse_seconds = 0.0
             
-            for chunk in response:
-                if chunk.text:
-                    full_response += chunk.text
-                    artifact_buffer += chunk.text
-                    if "<artifact" in artifact_buffer and not in_artifact:
-                        start_match = re.search(r'<artifact[^>]*>', artifact_buffer)
-                        if start_match:
-                            in_artifact = True
-                            artifact_start = artifact_buffer.find(start_match.group())
-                            artifact_buffer = artifact_buffer[artifact_start:]
-                    if in_artifact and "</artifact>" in artifact_buffer:
-                        end_pos = artifact_buffer.find("</artifact>") + len("</artifact>")
-                        artifact_xml = artifact_buffer[:end_pos]
-                        artifact_buffer = artifact_buffer[end_pos:]
-                        artifact_data = self._parse_artifact(artifact_xml)
-                        if artifact_data:
-                            artifacts.append(artifact_data)
-                            yield StreamChunk(delta="", done=False, artifact_detected=True, artifact_data=artifact_data)
-                        in_artifact = False
-                    yield StreamChunk(delta=chunk.text, done=False, artifact_detected=False)
-            yield StreamChunk(delta="", done=True, metadata={"full_response": full_response, "artifacts": artifacts})
+            texts = self._route_stream(api_key, language, contents, context_stats["prompt_tokens"])
+            async for text in texts:
+                if text:
+                    response_parts.append(text)
+                    parse_started = time.perf_counter()
+                    events = parser.feed(text)
+                    parse_seconds += time.perf_counter() - parse_started
+                    for event in events:
+                        yield self._chunk_for_event(event)
+            parse_started = time.perf_counter()
+            events = parser.finish()
+            parse_seconds += time.perf_counter() - parse_started
+            ARTIFACT_PARSE_SECONDS.labels(language or "none").observe(parse_seconds)
+            for event in events:
+                yield self._chunk_for_event(event)
+            full_response = "".join(response_parts)
+            artifacts = parser.artifacts
+            self.response_cache.store(*cache_key, full_response)
+            self.verified_keys.set(key_id, True)
+            yield StreamChunk(delta="", done=True, metadata={"full_response": full_response, "artifacts": artifacts, "context": context_stats})
         except Exception as e:
             yield StreamChunk(delta=f"Error: {str(e)}", done=True, metadata={"error": str(e)})
 
-    def _parse_artifact(self, artifact_xml: str) -> Optional[CodeArtifact]:
+    @staticmethod
+    def _chunk_for_event(event: ArtifactEvent) -> StreamChunk:
+        """Route chat text and artifact bytes to separate stream events"""
+        if event.kind == TEXT:
+            return StreamChunk(delta=event.text)
+        if event.kind == ARTIFACT_START:
+            artifact = CodeArtifact(
+                id=event.artifact_id,
+                language=event.attrs.get("language", "text"),
+                title=event.attrs.get("title", "Code"),
+                code="",
+            )
+            return StreamChunk(delta="", event=ARTIFACT_START, artifact_id=event.artifact_id, artifact_data=artifact)
+        if event.kind == ARTIFACT_DELTA:
+            return StreamChunk(delta=event.text, event=ARTIFACT_DELTA, artifact_id=event.artifact_id)
+        # The client assembles the code from deltas, so the end event carries no body
+        return StreamChunk(delta="", event=ARTIFACT_END, artifact_id=event.artifact_id, artifact_detected=event.artifact is not None)
+
+    async def _route_stream(
+        self,
+        api_key: Optional[str],
+        language: Optional[str],
+        contents: List[Dict[str, Any]],
+        prompt_tokens: int,
+    ) -> AsyncGenerator[str, None]:
+        """Stream from the router's preferred model, falling back to the next one on failure.
+
+        A route that fails upstream (see is_upstream_failure) or misses its
+        first-token timeout before producing any text is recorded as failed and
+        the next candidate is tried. Client errors such as a rejected API key
+        fail the request without touching the route's health, and once text
+        has been streamed, errors are raised as before.
+        """
+        error: Optional[Exception] = None
+        for attempt, route in enumerate(self.router.candidates(prompt_tokens, language)):
+            if attempt:
+                self.router.fallbacks += 1
+            started = time.perf_counter()
+            first = True
+            stream = self._open_route(route, api_key, language, contents)
+            try:
+                while True:
+                    try:
+                        if first and route.timeout:
+                            text = await asyncio.wait_for(stream.__anext__(), timeout=route.timeout)
+                        else:
+                            text = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    if first:
+                        first = False
+                        route.observe_latency(time.perf_counter() - started)
+                    yield text
+                route.observe_result(True)
+                return
+            except Exception as e:
+                if not is_upstream_failure(e):
+                    raise
+                route.observe_result(False)
+                if not first:
+                    raise
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"No response from {route.name} within {route.timeout:g}s")
+                error = e
+            finally:
+                await stream.aclose()
+        raise error
+
+    def _open_route(
+        self, route: ModelRoute, api_key: Optional[str], language: Optional[str], contents: List[Dict[str, Any]]
+    ) -> AsyncGenerator[str, None]:
+        if route.backend == "openai":
+            config = {**self.generation_config, **route.generation_config}
+            return self.router.stream_openai(route, self.system_instructions[language], contents, config)
+        return self._upstream_stream(route, api_key, language, contents)
+
+    async def _upstream_stream(
+        self, route: ModelRoute, api_key: Optional[str], language: Optional[str], contents: List[Dict[str, Any]]
+    ) -> AsyncGenerator[str, None]:
+        """The SDK stream behind the per-key rate limit, retried with backoff until it yields"""
+        _, key_id = self._resolve_key(api_key)
+        if _genai is None:
+            # Warmup hasn't finished (or is off): import the SDK on a thread, not the event loop
+            await asyncio.to_thread(load_sdk)
+        model = self._get_model(api_key, language=language, route=route)
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(key_id)
+            stream = self.hedger.race(
+                lambda: self._stream_texts(model, contents),
+                lambda: self.rate_limiter.try_acquire(key_id),
+            )
+            started = False
+            try:
+                async for text in stream:
+                    started = True
+                    yield text
+                return
+            except Exception as e:
+                # Once text has been sent a retry would repeat it, so only retry before that
+                if started or attempt >= self.retry_policy.max_retries or not self.retry_policy.is_retryable(e):
+                    raise
+            finally:
+                await stream.aclose()
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(self.retry_policy.delay(attempt))
+
+    @staticmethod
+    async def _stream_texts(model, contents: List[Dict[str, Any]]) -> AsyncGenerator[str, None]:
+        """Text of each chunk of the SDK's native async stream.
+
+        The gRPC stream is read directly: the SDK's response wrapper merges every
+        chunk into a running result, which costs more CPU per chunk than the rest
+        of the stream path and is never used here.
+        """
+        request = model._prepare_request(
+            contents=contents, generation_config=None, safety_settings=None, tools=None, tool_config=None
+        )
+        # RetryPolicy owns retries; the SDK's default would silently retry a 503 for up to 10 minutes
+        call = await model._async_client.stream_generate_content(request, retry=None)
         try:
-            attr_match = re.search(r'<artifact[^>]*type=\"([^\"]*)\"[^>]*language=\"([^\"]*)\"[^>]*title=\"([^\"]*)\"[^>]*>', artifact_xml)
-            if not attr_match:
-                return None
-            language = attr_match.group(2)
-            title = attr_match.group(3)
-            content_match = re.search(r'<artifact[^>]*>(.*?)</artifact>', artifact_xml, re.DOTALL)
-            if not content_match:
-                return None
-            code_content = content_match.group(1).strip()
-            return CodeArtifact(id=str(uuid.uuid4()), language=language, title=title, code=code_content)
-        except Exception:
-            return None
+            async for chunk in call:
+                message = type(chunk).pb(chunk)
+                if not message.candidates:
+                    if message.prompt_feedback.block_reason:
+                        raise ValueError(f"Prompt blocked: {chunk.prompt_feedback.block_reason.name}")
+                    continue
+                yield "".join(part.text for part in message.candidates[0].content.parts)
+        finally:
+            # An abandoned stream (client gone, hedge lost) must not keep its gRPC call open
+            call.cancel()
 
-    async def generate_response(self, messages: List[Dict[str, Any]], api_key: Optional[str] = None) -> Dict[str, Any]:
+    async def generate_response(
+        self,
+        messages: List[Dict[str, Any]],
+        api_key: Optional[str] = None,
+        session_id: Optional[str] = None,
+        language: Any = _DETECT,
+    ) -> Dict[str, Any]:
         try:
-            guardrail = self._build_guardrail(messages)
-            model = self._get_model(api_key, extra_instruction=guardrail)
-            contents = self._format_history(messages)
-            response = model.generate_content(contents)
-            artifacts = self._extract_artifacts(response.text)
-            return {"content": response.text, "artifacts": artifacts, "success": True}
+            if language is _DETECT:
+                language = self.detect_language(messages)
+            cache_key = self._cache_key(messages, language)
+            _, key_id = self._resolve_key(api_key)
+            cached = await self._cached_response(key_id, cache_key)
+            if cached is not None:
+                content = cached["full_response"]
+                return {"content": content, "artifacts": self._extract_artifacts(content), "success": True, "cached": True}
+            history, context_stats = self._build_context(messages, language, session_id)
+            contents = self._format_history(history)
+            # Assembled from the routed stream so fallback, retries and rate limits match /stream
+            texts = self._route_stream(api_key, language, contents, context_stats["prompt_tokens"])
+            content = "".join([text async for text in texts])
+            artifacts = self._extract_artifacts(content)
+            self.response_cache.store(*cache_key, content)
+            self.verified_keys.set(key_id, True)
+            return {"content": content, "artifacts": artifacts, "success": True, "context": context_stats}
         except Exception as e:
             return {"content": f"Error: {str(e)}", "artifacts": [], "success": False, "error": str(e)}
 
     def _extract_artifacts(self, content: str) -> List[CodeArtifact]:
-        artifacts: List[CodeArtifact] = []
-        artifact_pattern = r'<artifact[^>]*type=\"([^\"]*)\"[^>]*language=\"([^\"]*)\"[^>]*title=\"([^\"]*)\"[^>]*>(.*?)</artifact>'
-        matches = re.findall(artifact_pattern, content, re.DOTALL)
-        for match in matches:
-            artifact_type, language, title, code_content = match
-            if artifact_type == "code":
-                artifacts.append(CodeArtifact(id=str(uuid.uuid4()), language=language, title=title, code=code_content.strip()))
-        return artifacts
+        return ArtifactStreamParser.extract(content)
 
 
 # Global instance
@@ -0,0 +1,272 @@
+import asyncio
+import codecs
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from app.services.metrics import SANDBOX_PHASE_SECONDS
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# Applies the limits in the child and then execs the real command, so nothing
+# runs between fork and exec in this (multi-threaded) server process
+LIMITS_SHIM = (
+    "import os, resource, sys\n"
+    "cpu, memory, processes = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[4])\n"
+    "resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))\n"
+    "resource.setrlimit(resource.RLIMIT_FSIZE, (memory, memory))\n"
+    "resource.setrlimit(resource.RLIMIT_CORE, (0, 0))\n"
+    "resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))\n"
+    "if sys.argv[3] == '1':\n"
+    "    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+    "os.execvp(sys.argv[5], sys.argv[5:])\n"
+)
+
+
+class LocalSandboxBackend:
+    """Runs python/node code in a local subprocess under rlimits.
+
+    Sandbox backends expose ``start()``, ``close()`` and
+    ``execute(code, template, live, stdin)``, an async generator that yields
+    ("stdout" | "stderr", line) while running when ``live`` is set and always
+    ends with ("result", dict). Each run gets a fresh temp working dir, and at
+    most ``workers`` runs execute at once.
+    """
+
+    COMMANDS = {
+        "python": [sys.executable, "-I", "-u"],
+        "nodejs": ["node"],
+    }
+    FILE_NAMES = {
+        "python": "main.py",
+        "nodejs": "index.js",
+    }
+
+    def __init__(
+        self,
+        workers: int = 4,
+        cpu_seconds: int = 10,
+        memory_mb: int = 512,
+        wall_seconds: float = 30.0,
+        max_output_bytes: int = 1024 * 1024,
+        max_processes: int = 256,
+        root: Optional[str] = None,
+    ):
+        self.workers = workers
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.wall_seconds = wall_seconds
+        self.max_output_bytes = max_output_bytes
+        self.max_processes = max_processes
+        self.root = root
+        self.semaphore = asyncio.Semaphore(workers)
+        self.running = 0
+        self.executions = 0
+
+    @classmethod
+    def from_env(cls) -> "LocalSandboxBackend":
+        return cls(
+            workers=int(os.getenv("SANDBOX_LOCAL_WORKERS", str(os.cpu_count() or 4))),
+            cpu_seconds=int(os.getenv("SANDBOX_LOCAL_CPU_SECONDS", "10")),
+            memory_mb=int(os.getenv("SANDBOX_LOCAL_MEMORY_MB", "512")),
+            wall_seconds=float(os.getenv("SANDBOX_EXEC_TIMEOUT", "30")),
+            max_output_bytes=int(os.getenv("SANDBOX_LOCAL_MAX_OUTPUT_BYTES", str(1024 * 1024))),
+            # RLIMIT_NPROC counts every process and thread of the server's user, not just this run
+            max_processes=int(os.getenv("SANDBOX_LOCAL_MAX_PROCESSES", "256")),
+            root=os.getenv("SANDBOX_LOCAL_ROOT") or None,
+        )
+
+    async def start(self) -> None:
+        if self.root:
+            os.makedirs(self.root, exist_ok=True)
+
+    async def close(self) -> None:
+        pass
+
+    def _command(self, template: str, path: str) -> Optional[List[str]]:
+        command = self.COMMANDS.get(template)
+        if command is None or shutil.which(command[0]) is None:
+            return None
+        if template == "nodejs":
+            # V8 reserves far more address space than it uses, so cap its heap instead of RLIMIT_AS
+            return command + [f"--max-old-space-size={self.memory_mb}", path]
+        return command + [path]
+
+    def _limited(self, argv: List[str], template: str) -> List[str]:
+        """argv wrapped in LIMITS_SHIM (RLIMIT_AS is skipped for node, see _command)"""
+        if resource is None:
+            return argv
+        memory = self.memory_mb * 1024 * 1024
+        cap_address_space = "0" if template == "nodejs" else "1"
+        return [sys.executable, "-I", "-S", "-c", LIMITS_SHIM, str(self.cpu_seconds), str(memory), cap_address_space, str(self.max_processes), *argv]
+
+    @staticmethod
+    def _kill(process: asyncio.subprocess.Process) -> None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, name: str, queue: asyncio.Queue) -> None:
+        while True:
+            data = await stream.read(4096)
+            if not data:
+                break
+            await queue.put((name, data))
+        await queue.put((name, None))
+
+    @staticmethod
+    async def _feed(stream: asyncio.StreamWriter, data: str) -> None:
+        # Written from its own task so a program that doesn't read stdin can't block its output
+        try:
+            stream.write(data.encode())
+            await stream.drain()
+            stream.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    async def execute(
+        self, code: str, template: str, live: bool, stdin: Optional[str] = None
+    ) -> AsyncGenerator[Tuple[str, Any], None]:
+        file_name = self.FILE_NAMES.get(template)
+        if file_name is None or self._command(template, file_name) is None:
+            yield "result", {
+                "output": "",
+                "error": f"Template '{template}' is not available in the local sandbox",
+                "success": False
+            }
+            return
+
+        async with self.semaphore:
+            self.running += 1
+            self.executions += 1
+            phase_started = time.perf_counter()
+            workdir = tempfile.mkdtemp(prefix="sandbox-", dir=self.root)
+            try:
+                path = os.path.join(workdir, file_name)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(code)
+                phase_started = self._observe(template, "create", phase_started)
+                async for event in self._run(self._command(template, path), workdir, template, live, stdin):
+                    yield event
+            finally:
+                phase_started = self._observe(template, "run", phase_started)
+                shutil.rmtree(workdir, ignore_errors=True)
+                self._observe(template, "teardown", phase_started)
+                self.running -= 1
+
+    @staticmethod
+    def _observe(template: str, phase: str, started: float) -> float:
+        now = time.perf_counter()
+        SANDBOX_PHASE_SECONDS.labels("local", template, phase).observe(now - started)
+        return now
+
+    async def _run(
+        self, argv: List[str], workdir: str, template: str, live: bool, stdin: Optional[str]
+    ) -> AsyncGenerator[Tuple[str, Any], None]:
+        env = {
+            "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+            "HOME": workdir,
+            "LANG": "C.UTF-8",
+            "PYTHONIOENCODING": "utf-8",
+        }
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *self._limited(argv, template),
+            cwd=workdir,
+            env=env,
+            stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        queue: asyncio.Queue = asyncio.Queue()
+        pumps = [
+            asyncio.create_task(self._pump(process.stdout, "stdout", queue)),
+            asyncio.create_task(self._pump(process.stderr, "stderr", queue)),
+        ]
+        if stdin:
+            pumps.append(asyncio.create_task(self._feed(process.stdin, stdin)))
+        decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in ("stdout", "stderr")}
+        collected: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+        partial = {"stdout": "", "stderr": ""}
+        deadline = started + self.wall_seconds
+        size = 0
+        open_streams = 2
+        timed_out = truncated = False
+        try:
+            while open_streams:
+                try:
+                    name, data = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    break
+                if data is None:
+                    open_streams -= 1
+                    text = decoders[name].decode(b"", final=True)
+                else:
+                    if size + len(data) > self.max_output_bytes:
+                        data = data[:self.max_output_bytes - size]
+                        truncated = True
+                    size += len(data)
+                    text = decoders[name].decode(data)
+                collected[name].append(text)
+                if live:
+                    *lines, partial[name] = (partial[name] + text).split("\n")
+                    for line in lines:
+                        yield name, line + "\n"
+                if truncated:
+                    break
+
+            if not (timed_out or truncated):
+                # A program can close its output and keep running (or sleep, which RLIMIT_CPU never stops)
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=max(0.0, deadline - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    timed_out = True
+            if timed_out or truncated:
+                self._kill(process)
+            returncode = await process.wait()
+            execution_time = time.perf_counter() - started
+        finally:
+            # Also reaps whatever the program forked and left behind in its session
+            self._kill(process)
+            if process.returncode is None:
+                await process.wait()
+            for pump in pumps:
+                pump.cancel()
+
+        if live:
+            for name, rest in partial.items():
+                if rest:
+                    yield name, rest
+
+        error = "".join(collected["stderr"])
+        if timed_out:
+            error += f"Execution timed out after {self.wall_seconds:g}s"
+        elif truncated:
+            error += f"Output truncated at {self.max_output_bytes} bytes"
+        elif returncode == -signal.SIGXCPU or (returncode == -signal.SIGKILL and execution_time >= self.cpu_seconds):
+            error += f"CPU time limit of {self.cpu_seconds}s exceeded"
+        elif returncode < 0:
+            error += f"Process killed by {signal.Signals(-returncode).name}"
+        elif returncode > 0:
+            error += f"Exited with status {returncode}"
+
+        yield "result", {
+            "output": "".join(collected["stdout"]),
+            "error": error,
+            "execution_time": execution_time,
+            "success": returncode == 0 and not (timed_out or truncated),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "running": self.running, "executions": self.executions}
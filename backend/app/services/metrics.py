@@ -0,0 +1,253 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds, from a fast cache hit up to a long generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # Per-bucket (non-cumulative) counts, the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    """Labelled family of series; subclasses set ``kind`` and build children in ``_new_child``"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values: Any, **named: Any):
+        """The child series for these label values, created on first use"""
+        key = tuple(str(named[name]) for name in self.labelnames) if named else tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry: "Registry" = None,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+# A collector returns (name, kind, documentation, [(labels, value), ...]) tuples at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text exposition format (0.0.4)"""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Collector] = []
+
+    def register(self, metric: _Metric) -> None:
+        self.metrics.append(metric)
+
+    def register_collector(self, collector: Collector) -> None:
+        """Add a callback exporting values that already live in service stats"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self.collectors:
+            for name, kind, documentation, series in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_format_labels(names, [str(labels[n]) for n in names])} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Global instance
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request duration until the response body completes",
+    ["route", "method", "status"],
+)
+CHAT_TTFT_SECONDS = Histogram(
+    "chat_time_to_first_token_seconds", "Time from request to the first streamed frame with content",
+    ["route", "language"],
+)
+CHAT_TOKENS_PER_SECOND = Histogram(
+    "chat_tokens_per_second", "Estimated output tokens per second after the first token",
+    ["route", "language"], buckets=RATE_BUCKETS,
+)
+CHAT_STREAM_SECONDS = Histogram(
+    "chat_stream_duration_seconds", "Duration of a chat generation stream",
+    ["route", "language", "outcome"],
+)
+CHAT_STREAMS_IN_FLIGHT = Gauge(
+    "chat_streams_in_flight", "Chat generations currently running", ["route"],
+)
+ARTIFACT_PARSE_SECONDS = Histogram(
+    "artifact_parse_seconds", "Time spent in the artifact stream parser per response",
+    ["language"], buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+CHAT_STREAMS_ABANDONED = Counter(
+    "chat_streams_abandoned_total", "Generations whose clients all disconnected, by what was done about it",
+    ["action"],
+)
+CHAT_WASTED_TOKENS = Counter(
+    "chat_wasted_tokens_total", "Estimated tokens generated after the clients left that none of them received",
+    ["action"],
+)
+SANDBOX_PHASE_SECONDS = Histogram(
+    "sandbox_phase_seconds", "Sandbox execution phases: create, run and teardown",
+    ["backend", "template", "phase"],
+)
+
+
+class StreamTimer:
+    """Records TTFT, duration and throughput for one chat stream"""
+
+    def __init__(self, route: str, language: Optional[str]):
+        self.route = route
+        self.language = language or "none"
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.chars = 0
+        self.finished = False
+        CHAT_STREAMS_IN_FLIGHT.labels(route).inc()
+
+    def token(self, text: str) -> None:
+        if text:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+                CHAT_TTFT_SECONDS.labels(self.route, self.language).observe(self.first_token_at - self.started)
+            self.chars += len(text)
+
+    def finish(self, outcome: str) -> None:
+        """outcome is ok, cached, error or aborted; only the first call counts"""
+        if self.finished:
+            return
+        self.finished = True
+        now = time.perf_counter()
+        CHAT_STREAMS_IN_FLIGHT.labels(self.route).dec()
+        CHAT_STREAM_SECONDS.labels(self.route, self.language, outcome).observe(now - self.started)
+        # Cache replays say nothing about generation throughput
+        if self.first_token_at is not None and now > self.first_token_at and outcome == "ok":
+            tokens = (self.chars + 3) // 4
+            CHAT_TOKENS_PER_SECOND.labels(self.route, self.language).observe(tokens / (now - self.first_token_at))
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+import aiohttp
+
+from app.services.upstream import RetryPolicy
+
+# Weight of the newest observation in the latency and error-rate averages
+EWMA_ALPHA = 0.2
+
+
+class UpstreamError(Exception):
+    """A non-2xx answer from an OpenAI-compatible endpoint; ``code`` is the HTTP status"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"Upstream error {code}: {message}")
+        self.code = code
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether an error says something about the route's health.
+
+    Timeouts, connection problems, 429s and 5xxs do; a tenant's bad API key,
+    a rejected request or the per-key rate limit don't, so they must not
+    shift everyone's traffic to a fallback route.
+    """
+    if isinstance(error, (OSError, asyncio.TimeoutError, aiohttp.ClientConnectionError)):
+        return True
+    return RetryPolicy.is_retryable(error)
+
+
+class ModelRoute:
+    """One model on one backend, with the requests it may serve and its observed health.
+
+    ``backend`` is "gemini" or "openai" (any OpenAI-compatible chat
+    completions endpoint, e.g. a local vLLM or Ollama server). A route serves
+    prompts between ``min_prompt_tokens`` and ``max_prompt_tokens`` and, when
+    ``languages`` is set, only those target languages. It is considered
+    degraded while its error rate is above ``max_error_rate`` or its
+    first-token latency above ``max_latency``, and is then only probed once
+    every ``cooldown`` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        backend: str = "gemini",
+        base_url: Optional[str] = None,
+        api_key_env: Optional[str] = None,
+        generation_config: Optional[Dict[str, Any]] = None,
+        min_prompt_tokens: int = 0,
+        max_prompt_tokens: Optional[int] = None,
+        languages: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+        max_latency: Optional[float] = None,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+    ):
+        if backend not in ("gemini", "openai"):
+            raise ValueError(f"Unsupported model backend: {backend}")
+        if backend == "openai" and not base_url:
+            raise ValueError(f"Route '{name}' needs a base_url for the openai backend")
+        self.name = name
+        self.model = model
+        self.backend = backend
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.api_key_env = api_key_env
+        self.generation_config = generation_config or {}
+        self.min_prompt_tokens = min_prompt_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+        self.languages = languages
+        self.timeout = timeout
+        self.max_latency = max_latency
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+
+        self.latency: Optional[float] = None  # EWMA seconds to the first token
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.probe_at = 0.0
+
+    def accepts(self, prompt_tokens: int, language: Optional[str]) -> bool:
+        if prompt_tokens < self.min_prompt_tokens:
+            return False
+        if self.max_prompt_tokens is not None and prompt_tokens > self.max_prompt_tokens:
+            return False
+        return not self.languages or language in self.languages
+
+    def degraded(self) -> bool:
+        if self.error_rate > self.max_error_rate:
+            return True
+        return self.max_latency is not None and self.latency is not None and self.latency > self.max_latency
+
+    def score(self) -> float:
+        """Lower is better: expected latency inflated by the error rate"""
+        return (self.latency or 0.0) * (1 + 4 * self.error_rate)
+
+    def observe_latency(self, seconds: float) -> None:
+        self.latency = seconds if self.latency is None else (1 - EWMA_ALPHA) * self.latency + EWMA_ALPHA * seconds
+
+    def observe_result(self, ok: bool) -> None:
+        self.requests += 1
+        if not ok:
+            self.failures += 1
+        self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA * (0.0 if ok else 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "model": self.model,
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "failures": self.failures,
+            "degraded": self.degraded(),
+        }
+
+
+class ModelRouter:
+    """Orders the configured routes for a request.
+
+    Routes are preferred in configuration order. Eligible routes that are
+    degraded move behind the healthy ones (best score first) except for an
+    occasional probe, so traffic sheds to the next model while one is slow
+    or failing and returns once it recovers. Callers fall back along the
+    returned list when a route fails before its first token.
+    """
+
+    def __init__(self, routes: List[ModelRoute]):
+        if not routes:
+            raise ValueError("At least one model route is required")
+        self.routes = routes
+        self.fallbacks = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_env(cls, default_model: str) -> "ModelRouter":
+        """MODEL_ROUTES is a JSON list of ModelRoute arguments; unset means just the default model"""
+        raw = os.getenv("MODEL_ROUTES")
+        if not raw:
+            return cls([ModelRoute(name=default_model, model=default_model)])
+        routes = []
+        for spec in json.loads(raw):
+            spec.setdefault("name", spec.get("model"))
+            routes.append(ModelRoute(**spec))
+        return cls(routes)
+
+    def candidates(self, prompt_tokens: int, language: Optional[str]) -> List[ModelRoute]:
+        eligible = [route for route in self.routes if route.accepts(prompt_tokens, language)]
+        if not eligible:
+            # Better to try a route outside its configured range than to fail the request
+            eligible = list(self.routes)
+        now = time.monotonic()
+        healthy, degraded = [], []
+        for route in eligible:
+            if not route.degraded():
+                healthy.append(route)
+            elif now >= route.probe_at:
+                # Let one request through to find out whether it recovered
+                route.probe_at = now + route.cooldown
+                healthy.append(route)
+            else:
+                degraded.append(route)
+        return healthy + sorted(degraded, key=ModelRoute.score)
+
+    def signature(self) -> List[str]:
+        """Identifies the configured models, e.g. for cache keys"""
+        return [
+            f"{route.backend}:{route.model}:{json.dumps(route.generation_config, sort_keys=True)}" for route in self.routes
+        ]
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=10))
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def stream_openai(
+        self,
+        route: ModelRoute,
+        system_instruction: str,
+        contents: List[Dict[str, Any]],
+        generation_config: Dict[str, Any],
+    ) -> AsyncGenerator[str, None]:
+        """Stream text deltas from an OpenAI-compatible /chat/completions endpoint"""
+        messages = [{"role": "system", "content": system_instruction}]
+        for item in contents:
+            role = "assistant" if item["role"] == "model" else "user"
+            messages.append({"role": role, "content": "".join(part.get("text", "") for part in item["parts"])})
+        payload = {
+            "model": route.model,
+            "messages": messages,
+            "stream": True,
+            "temperature": generation_config.get("temperature"),
+            "top_p": generation_config.get("top_p"),
+            "max_tokens": generation_config.get("max_output_tokens"),
+        }
+        headers = {"Content-Type": "application/json"}
+        api_key = os.getenv(route.api_key_env) if route.api_key_env else None
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        session = await self._get_session()
+        async with session.post(
+            f"{route.base_url}/chat/completions",
+            headers=headers,
+            json={k: v for k, v in payload.items() if v is not None},
+        ) as response:
+            if response.status != 200:
+                raise UpstreamError(response.status, (await response.text())[:200])
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    return
+                choices = json.loads(data).get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+
+    def stats(self) -> Dict[str, Any]:
+        return {"fallbacks": self.fallbacks, "routes": {route.name: route.stats() for route in self.routes}}
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.services.cache import TTLCache
+from app.services.shared_state import shared_state
+
+
+WORD_PATTERN = re.compile(r"[a-z0-9#+]+")
+EMBEDDING_DIMENSIONS = 4096
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase and collapse whitespace so trivial variants share a key.
+
+    Punctuation is kept: in code "x < 0" and "x > 0" are different questions.
+    Looser matching is left to the optional similarity tier.
+    """
+    return " ".join(text.lower().split())
+
+
+def embed(text: str) -> Dict[int, float]:
+    """Local hashed bag-of-words embedding (unigrams + bigrams), L2-normalized"""
+    words = WORD_PATTERN.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector: Dict[int, float] = {}
+    for feature in features:
+        bucket = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "big") % EMBEDDING_DIMENSIONS
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {k: v / norm for k, v in vector.items()}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class ResponseCache:
+    """Cache of complete model answers keyed on prompt, language, context and model config.
+
+    Exact lookups hash the normalized prompt; when ``similarity`` is above zero a
+    near-duplicate prompt in the same (config, language, context) bucket can
+    also be served if its embedding cosine reaches that threshold.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = 2048,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 3600.0,
+        similarity: float = 0.0,
+        bucket_size: int = 512,
+        max_buckets: int = 1024,
+        shared: Any = None,
+    ):
+        self.enabled = enabled
+        self.similarity = similarity
+        self.bucket_size = bucket_size
+        self.max_buckets = max_buckets
+        self.entries = TTLCache(
+            max_entries=max_entries,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            sizeof=lambda entry: len(entry["full_response"].encode()),
+            shared=shared,
+            namespace="response",
+        )
+        self._buckets: "OrderedDict[str, Deque[Tuple[str, Dict[int, float]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.stores = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            enabled=os.getenv("RESPONSE_CACHE_ENABLED", "1") not in ("0", "false", "False"),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048")),
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+            similarity=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0")),
+            shared=shared_state,
+        )
+
+    @staticmethod
+    def context_hash(messages: List[Dict[str, Any]]) -> str:
+        """Hash of everything before the latest message, so follow-ups never collide"""
+        digest = hashlib.sha256()
+        for msg in messages[:-1]:
+            digest.update(f"{msg.get('role')}\x00{msg.get('content')}\x00".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _bucket(model_config: Dict[str, Any], language: Optional[str], context: str) -> str:
+        config = json.dumps(model_config, sort_keys=True, default=str)
+        return hashlib.sha256(f"{config}|{language}|{context}".encode()).hexdigest()
+
+    async def lookup(
+        self,
+        prompt: str,
+        language: Optional[str],
+        context: str,
+        model_config: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        normalized = normalize_prompt(prompt)
+        bucket = self._bucket(model_config, language, context)
+        key = f"{bucket}:{normalized}"
+        with self._lock:
+            self.lookups += 1
+        entry = await self.entries.aget(key)
+        if entry is not None:
+            with self._lock:
+                self.exact_hits += 1
+            return entry
+        if self.similarity <= 0:
+            return None
+
+        vector = embed(normalized)
+        best_key, best_score = None, self.similarity
+        with self._lock:
+            candidates = list(self._buckets.get(bucket, ()))
+        for candidate_key, candidate_vector in candidates:
+            score = cosine(vector, candidate_vector)
+            if score >= best_score:
+                best_key, best_score = candidate_key, score
+        if best_key is None:
+            return None
+        entry = await self.entries.aget(best_key)
+        if entry is not None:
+            with self._lock:
+                self.semantic_hits += 1
+        return entry
+
+    def store(
+        self,
+        prompt: str,
+        language: Optional[str],
+        context: str,
+        model_config: Dict[str, Any],
+        full_response: str,
+    ) -> None:
+        if not self.enabled or not full_response:
+            return
+        normalized = normalize_prompt(prompt)
+        bucket = self._bucket(model_config, language, context)
+        key = f"{bucket}:{normalized}"
+        if not self.entries.set(key, {"full_response": full_response}):
+            return
+        with self._lock:
+            self.stores += 1
+            if self.similarity > 0:
+                entries = self._buckets.setdefault(bucket, deque(maxlen=self.bucket_size))
+                entries.append((key, embed(normalized)))
+                self._buckets.move_to_end(bucket)
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "enabled": self.enabled,
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            "stores": self.stores,
+            "entries": self.entries.stats(),
+        }
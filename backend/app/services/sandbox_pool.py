@@ -0,0 +1,176 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+class WarmSandbox:
+    """A provisioned sandbox owned by the pool"""
+
+    def __init__(self, sandbox_id: str, template: str):
+        self.id = sandbox_id
+        self.template = template
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+
+class SandboxPool:
+    """Per-template pool of pre-provisioned sandboxes.
+
+    ``provider`` supplies the remote operations: ``create_sandbox(template)``,
+    ``reset_sandbox(id)``, ``sandbox_healthy(id)`` and ``delete_sandbox(id)``.
+    A background task keeps ``min_size`` idle sandboxes per template, reaps
+    extras idle for longer than ``idle_ttl`` and drops ones failing health checks.
+    """
+
+    def __init__(
+        self,
+        provider: Any,
+        templates: List[str],
+        min_size: int = 1,
+        max_size: int = 5,
+        idle_ttl: float = 300.0,
+        health_interval: float = 30.0,
+        max_uses: int = 50,
+        lease_timeout: float = 30.0,
+    ):
+        self.provider = provider
+        self.templates = templates
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.health_interval = health_interval
+        self.max_uses = max_uses
+        self.lease_timeout = lease_timeout
+        self.idle: Dict[str, Deque[WarmSandbox]] = {t: deque() for t in templates}
+        self.total: Dict[str, int] = {t: 0 for t in templates}
+        self._available: Dict[str, asyncio.Condition] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.leases = 0
+        self.warm_hits = 0
+        self.cold_starts = 0
+
+    def _condition(self, template: str) -> asyncio.Condition:
+        if template not in self._available:
+            self._available[template] = asyncio.Condition()
+        return self._available[template]
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for template, idle in self.idle.items():
+            while idle:
+                await self._destroy(idle.popleft())
+
+    async def _provision(self, template: str) -> Optional[WarmSandbox]:
+        self.total[template] += 1
+        try:
+            sandbox_id = await self.provider.create_sandbox(template)
+        except Exception:
+            sandbox_id = None
+        if sandbox_id is None:
+            self.total[template] -= 1
+            return None
+        return WarmSandbox(sandbox_id, template)
+
+    async def _destroy(self, sandbox: WarmSandbox) -> None:
+        self.total[sandbox.template] -= 1
+        try:
+            await self.provider.delete_sandbox(sandbox.id)
+        except Exception:
+            pass
+
+    async def lease(self, template: str) -> WarmSandbox:
+        """Take an idle sandbox, provisioning one if the pool is below max_size"""
+        self.leases += 1
+        condition = self._condition(template)
+        deadline = time.monotonic() + self.lease_timeout
+        async with condition:
+            while True:
+                idle = self.idle[template]
+                if idle:
+                    self.warm_hits += 1
+                    return idle.pop()
+                if self.total[template] < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No {template} sandbox available")
+                try:
+                    await asyncio.wait_for(condition.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"No {template} sandbox available")
+        self.cold_starts += 1
+        sandbox = await self._provision(template)
+        if sandbox is None:
+            raise RuntimeError(f"Failed to provision {template} sandbox")
+        return sandbox
+
+    async def release(self, sandbox: WarmSandbox, reusable: bool = True) -> None:
+        """Return a sandbox after resetting it, or destroy it if it cannot be reused"""
+        sandbox.uses += 1
+        sandbox.last_used = time.monotonic()
+        if reusable and sandbox.uses < self.max_uses:
+            try:
+                reusable = await self.provider.reset_sandbox(sandbox.id)
+            except Exception:
+                reusable = False
+        else:
+            reusable = False
+        if not reusable:
+            await self._destroy(sandbox)
+        condition = self._condition(sandbox.template)
+        async with condition:
+            if reusable:
+                self.idle[sandbox.template].append(sandbox)
+            condition.notify()
+
+    async def _maintain(self) -> None:
+        while True:
+            for template in self.templates:
+                try:
+                    await self._reap_and_check(template)
+                    await self._refill(template)
+                except Exception as e:
+                    print(f"Warning: sandbox pool maintenance failed for {template}: {e}")
+            await asyncio.sleep(self.health_interval)
+
+    async def _reap_and_check(self, template: str) -> None:
+        idle = self.idle[template]
+        now = time.monotonic()
+        for sandbox in list(idle):
+            expired = now - sandbox.last_used > self.idle_ttl and len(idle) > self.min_size
+            if not expired and await self.provider.sandbox_healthy(sandbox.id):
+                continue
+            # It may have been leased while the health check was in flight
+            if sandbox in idle:
+                idle.remove(sandbox)
+                await self._destroy(sandbox)
+
+    async def _refill(self, template: str) -> None:
+        condition = self._condition(template)
+        while len(self.idle[template]) < self.min_size and self.total[template] < self.max_size:
+            sandbox = await self._provision(template)
+            if sandbox is None:
+                return
+            async with condition:
+                self.idle[template].append(sandbox)
+                condition.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "leases": self.leases,
+            "warm_hits": self.warm_hits,
+            "cold_starts": self.cold_starts,
+            "templates": {t: {"idle": len(self.idle[t]), "total": self.total[t]} for t in self.templates},
+        }
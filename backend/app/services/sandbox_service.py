@@ -1,8 +1,16 @@
 import os
 import asyncio
 import aiohttp
-from typing import Dict, Any, Optional
-from app.models.chat import SandboxRequest, SandboxResponse
+import hashlib
+import time
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
+from app.models.chat import BatchRequest, SandboxRequest, SandboxResponse
+from app.services.admission import Ticket, sandbox_admission
+from app.services.cache import TTLCache
+from app.services.local_sandbox import LocalSandboxBackend
+from app.services.metrics import SANDBOX_PHASE_SECONDS
+from app.services.sandbox_pool import SandboxPool, WarmSandbox
+from app.services.shared_state import shared_state
 
 
 class SandboxService:
@@ -10,15 +18,140 @@ class SandboxService:
     
     def __init__(self):
         self.api_key = os.getenv("E2B_API_KEY")
-        self.base_url = "https://api.e2b.dev"
+        self.base_url = os.getenv("E2B_API_URL", "https://api.e2b.dev")
         
-        if not self.api_key:
+        # Completion polling: backoff from SANDBOX_POLL_INITIAL up to SANDBOX_POLL_MAX seconds
+        self.poll_initial = float(os.getenv("SANDBOX_POLL_INITIAL", "0.05"))
+        self.poll_max = float(os.getenv("SANDBOX_POLL_MAX", "1"))
+        self.exec_timeout = float(os.getenv("SANDBOX_EXEC_TIMEOUT", "30"))
+        
+        # Shared HTTP connection pool, opened at app startup and closed on shutdown
+        self.max_connections = int(os.getenv("SANDBOX_HTTP_MAX_CONNECTIONS", "100"))
+        self.max_connections_per_host = int(os.getenv("SANDBOX_HTTP_MAX_PER_HOST", "20"))
+        self.dns_cache_ttl = int(os.getenv("SANDBOX_DNS_CACHE_TTL", "300"))
+        self.timeout = aiohttp.ClientTimeout(
+            total=float(os.getenv("SANDBOX_HTTP_TIMEOUT", "30")),
+            connect=float(os.getenv("SANDBOX_HTTP_CONNECT_TIMEOUT", "5")),
+        )
+        self.session: Optional[aiohttp.ClientSession] = None
+        
+        # SANDBOX_BACKEND=local runs code in subprocesses on this node instead of e2b
+        self.backend: Optional[LocalSandboxBackend] = None
+        if os.getenv("SANDBOX_BACKEND", "e2b") == "local":
+            self.backend = LocalSandboxBackend.from_env()
+        
+        # Warm per-template sandboxes, leased instead of created per execution
+        self.pool: Optional[SandboxPool] = None
+        if self.backend is None and os.getenv("SANDBOX_POOL_ENABLED", "0") in ("1", "true", "True"):
+            self.pool = SandboxPool(
+                self,
+                ["python", "nodejs", "static"],
+                min_size=int(os.getenv("SANDBOX_POOL_MIN", "1")),
+                max_size=int(os.getenv("SANDBOX_POOL_MAX", "5")),
+                idle_ttl=float(os.getenv("SANDBOX_POOL_IDLE_TTL", "300")),
+                health_interval=float(os.getenv("SANDBOX_POOL_HEALTH_INTERVAL", "30")),
+            )
+        
+        # Batch jobs run concurrently, at most SANDBOX_BATCH_CONCURRENCY at a time
+        self.batch_concurrency = int(os.getenv("SANDBOX_BATCH_CONCURRENCY", "4"))
+        self.batch_max_jobs = int(os.getenv("SANDBOX_BATCH_MAX_JOBS", "32"))
+        
+        # Results of successful runs, keyed by template and the exact content executed
+        self.result_cache: Optional[TTLCache] = None
+        if os.getenv("SANDBOX_CACHE_ENABLED", "1") not in ("0", "false", "False"):
+            self.result_cache = TTLCache(
+                max_entries=int(os.getenv("SANDBOX_CACHE_MAX_ENTRIES", "1024")),
+                ttl=float(os.getenv("SANDBOX_CACHE_TTL", "600")),
+                max_bytes=int(os.getenv("SANDBOX_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+                sizeof=lambda result: len(result.get("output") or "") + len(result.get("error") or ""),
+                shared=shared_state,
+                namespace="sandbox",
+            )
+        
+        if self.backend is None and not self.api_key:
             print("Warning: E2B_API_KEY not found. Sandbox features will be disabled.")
     
+    async def start(self):
+        """Open the pooled HTTP session"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=30,
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        if self.backend is not None:
+            await self.backend.start()
+        if self.pool is not None and self.api_key:
+            await self.pool.start()
+    
+    async def close(self):
+        """Close the pooled HTTP session"""
+        if self.backend is not None:
+            await self.backend.close()
+        if self.pool is not None:
+            await self.pool.close()
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Lazily opened when used outside the app lifecycle (scripts, benchmarks)
+        if self.session is None or self.session.closed:
+            await self.start()
+        return self.session
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    async def create_sandbox(self, template: str) -> Optional[str]:
+        """Provision an empty sandbox for the pool"""
+        session = await self._get_session()
+        async with session.post(
+            f"{self.base_url}/sandboxes",
+            headers=self._headers(),
+            json={"template": template}
+        ) as response:
+            if response.status != 200:
+                return None
+            return (await response.json())["id"]
+    
+    async def reset_sandbox(self, sandbox_id: str) -> bool:
+        """Wipe files and processes so the sandbox can be leased again"""
+        session = await self._get_session()
+        async with session.post(
+            f"{self.base_url}/sandboxes/{sandbox_id}/reset",
+            headers=self._headers()
+        ) as response:
+            return response.status == 200
+    
+    async def sandbox_healthy(self, sandbox_id: str) -> bool:
+        session = await self._get_session()
+        try:
+            async with session.get(
+                f"{self.base_url}/sandboxes/{sandbox_id}",
+                headers=self._headers()
+            ) as response:
+                return response.status == 200
+        except aiohttp.ClientError:
+            return False
+    
+    async def delete_sandbox(self, sandbox_id: str) -> None:
+        session = await self._get_session()
+        async with session.delete(
+            f"{self.base_url}/sandboxes/{sandbox_id}",
+            headers=self._headers()
+        ):
+            pass
+    
     async def execute_code(self, request: SandboxRequest) -> SandboxResponse:
         """Execute code in e2b.dev sandbox"""
         
-        if not self.api_key:
+        if self.backend is None and not self.api_key:
             return SandboxResponse(
                 output="Sandbox service not available. Please configure E2B_API_KEY.",
                 error="E2B_API_KEY not configured",
@@ -37,15 +170,12 @@ class SandboxService:
                 )
             
             # Execute code
-            result = await self._run_in_sandbox(request.code, template)
-            
-            return SandboxResponse(
-                output=result.get("output", ""),
-                error=result.get("error"),
-                execution_time=result.get("execution_time"),
-                success=result.get("success", False)
+            result = await self._run_in_sandbox(
+                request.code, template, use_cache=not request.bypass_cache, stdin=request.stdin
             )
             
+            return self._to_response(result)
+            
         except Exception as e:
             return SandboxResponse(
                 output="",
@@ -53,6 +183,16 @@ class SandboxService:
                 success=False
             )
     
+    async def cached_response(self, request: SandboxRequest) -> Optional[SandboxResponse]:
+        """The cached result for a request, if any; checked before admission so repeats skip the queue"""
+        if request.bypass_cache:
+            return None
+        template = self._get_template_for_language(request.language)
+        if not template:
+            return None
+        cached = await self._cached_result(request.code, template, request.stdin)
+        return self._to_response(cached) if cached is not None else None
+    
     def _get_template_for_language(self, language: str) -> Optional[str]:
         """Get e2b template for the given language"""
         template_map = {
@@ -69,106 +209,329 @@ class SandboxService:
         
         return template_map.get(language.lower())
     
-    async def _run_in_sandbox(self, code: str, template: str) -> Dict[str, Any]:
+    @staticmethod
+    def _to_response(result: Dict[str, Any]) -> SandboxResponse:
+        return SandboxResponse(
+            output=result.get("output", ""),
+            error=result.get("error"),
+            execution_time=result.get("execution_time"),
+            success=result.get("success", False),
+            cached=result.get("cached", False)
+        )
+    
+    def _result_key(self, code: str, template: str, stdin: Optional[str] = None) -> str:
+        content = self._create_html_file(code) if template == "static" else code
+        digest = hashlib.sha256(content.encode())
+        if stdin:
+            digest.update(b"\x00stdin\x00" + stdin.encode())
+        return f"{template}:{digest.hexdigest()}"
+    
+    async def _cached_result(self, code: str, template: str, stdin: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if self.result_cache is None:
+            return None
+        result = await self.result_cache.aget(self._result_key(code, template, stdin))
+        if result is None:
+            return None
+        return {**result, "cached": True}
+    
+    def _store_result(self, code: str, template: str, result: Dict[str, Any], stdin: Optional[str] = None) -> None:
+        # Only completed runs are worth replaying; infrastructure errors and timeouts are retried
+        if self.result_cache is None or not result.get("success"):
+            return
+        self.result_cache.set(self._result_key(code, template, stdin), result)
+    
+    async def _run_in_sandbox(
+        self, code: str, template: str, use_cache: bool = True, stdin: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Run code in e2b sandbox"""
+        if use_cache:
+            cached = await self._cached_result(code, template, stdin)
+            if cached is not None:
+                return cached
+        result: Dict[str, Any] = {}
+        async for event, data in self._execute(code, template, live=False, stdin=stdin):
+            if event == "result":
+                result = data
+        self._store_result(code, template, result, stdin)
+        return result
+    
+    async def stream_code(self, request: SandboxRequest) -> AsyncGenerator[Tuple[str, Any], None]:
+        """Execute code, yielding ("stdout" | "stderr", line) as output appears and a final ("result", SandboxResponse)"""
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        if self.backend is None and not self.api_key:
+            yield "result", await self.execute_code(request)
+            return
+        
+        template = self._get_template_for_language(request.language)
+        if not template:
+            yield "result", await self.execute_code(request)
+            return
+        
+        if not request.bypass_cache:
+            cached = await self._cached_result(request.code, template, request.stdin)
+            if cached is not None:
+                yield "result", self._to_response(cached)
+                return
+        
+        async for event, data in self._execute(request.code, template, live=True, stdin=request.stdin):
+            if event == "result":
+                self._store_result(request.code, template, data, request.stdin)
+                yield event, self._to_response(data)
+            else:
+                yield event, data
+    
+    async def execute_batch(
+        self, request: BatchRequest, ticket: Optional[Ticket] = None
+    ) -> AsyncGenerator[Tuple[int, SandboxResponse, float], None]:
+        """Run the jobs concurrently, yielding (index, response, elapsed seconds) as each one finishes.
+
+        Every running job holds an admission slot, so a batch counts against
+        the global sandbox limit like the same number of single runs.
+        ``ticket`` is a slot the caller already holds (one is acquired if not);
+        more are taken only while free, so the batch never queues behind
+        itself, and all are released when it ends.
+        """
+        if ticket is None:
+            ticket = await sandbox_admission.acquire(request.session_id)
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        held = [ticket]
+        idle: asyncio.Queue = asyncio.Queue()
+        idle.put_nowait(ticket)
+        
+        async def take_slot() -> Ticket:
+            if idle.empty():
+                slot = sandbox_admission.try_acquire(request.session_id)
+                if slot is not None:
+                    held.append(slot)
+                    return slot
+            return await idle.get()
+        
+        async def run(index: int, job) -> Tuple[int, SandboxResponse, float]:
+            async with semaphore:
+                started = time.perf_counter()
+                slot = await take_slot()
+                try:
+                    response = await self.execute_code(SandboxRequest(
+                        code=job.code,
+                        language=job.language,
+                        stdin=job.stdin,
+                        session_id=request.session_id,
+                        bypass_cache=request.bypass_cache
+                    ))
+                finally:
+                    idle.put_nowait(slot)
+                return index, response, time.perf_counter() - started
+        
+        tasks = [asyncio.create_task(run(index, job)) for index, job in enumerate(request.jobs)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for slot in held:
+                slot.release()
+    
+    async def _execute(
+        self, code: str, template: str, live: bool, stdin: Optional[str] = None
+    ) -> AsyncGenerator[Tuple[str, Any], None]:
+        """Start the code in a sandbox and follow it to completion.
+        
+        With ``live`` set, complete stdout/stderr lines are yielded as they
+        appear; the last event is always ("result", dict).
+        """
+        
+        if self.backend is not None:
+            async for event in self.backend.execute(code, template, live, stdin):
+                yield event
+            return
+        
+        headers = self._headers()
         
         # For HTML/CSS/JS, we need to create a complete HTML file
         if template == "static":
-            html_content = self._create_html_file(code)
-            payload = {
-                "template": template,
-                "files": [
-                    {
-                        "path": "index.html",
-                        "content": html_content
-                    }
-                ]
-            }
+            files = [{"path": "index.html", "content": self._create_html_file(code)}]
         else:
             # For other languages, create appropriate files
-            file_path = self._get_file_path_for_language(template)
-            payload = {
-                "template": template,
-                "files": [
-                    {
-                        "path": file_path,
-                        "content": code
-                    }
-                ]
-            }
+            files = [{"path": self._get_file_path_for_language(template), "content": code}]
         
-        async with aiohttp.ClientSession() as session:
-            try:
-                # Create sandbox
+        run_options = {"stdin": stdin} if stdin else {}
+        
+        session = await self._get_session()
+        sandbox: Optional[WarmSandbox] = None
+        sandbox_id: Optional[str] = None
+        reusable = False
+        phases = SANDBOX_PHASE_SECONDS.labels
+        backend_name = "e2b-pool" if self.pool is not None else "e2b"
+        phase_started = time.perf_counter()
+        try:
+            if self.pool is not None:
+                # Upload the files into a warm sandbox and start the entry point
+                sandbox = await self.pool.lease(template)
+                sandbox_id = sandbox.id
+                async with session.post(
+                    f"{self.base_url}/sandboxes/{sandbox_id}/files",
+                    headers=headers,
+                    json={"files": files}
+                ) as response:
+                    if response.status != 200:
+                        yield "result", {
+                            "output": "",
+                            "error": f"Failed to upload files: {await response.text()}",
+                            "success": False
+                        }
+                        return
+                async with session.post(
+                    f"{self.base_url}/sandboxes/{sandbox_id}/run",
+                    headers=headers,
+                    json={"path": files[0]["path"], **run_options}
+                ) as response:
+                    if response.status != 200:
+                        yield "result", {
+                            "output": "",
+                            "error": f"Failed to start execution: {await response.text()}",
+                            "success": False
+                        }
+                        return
+            else:
+                # Create sandbox (it runs the uploaded entry point on boot)
                 async with session.post(
                     f"{self.base_url}/sandboxes",
                     headers=headers,
-                    json=payload
+                    json={"template": template, "files": files, **run_options}
                 ) as response:
                     if response.status != 200:
-                        return {
+                        yield "result", {
                             "output": "",
                             "error": f"Failed to create sandbox: {await response.text()}",
                             "success": False
                         }
+                        return
                     
                     sandbox_data = await response.json()
                     sandbox_id = sandbox_data["id"]
-                
-                # Wait a bit for sandbox to be ready
-                await asyncio.sleep(2)
-                
-                # Get sandbox output
-                async with session.get(
-                    f"{self.base_url}/sandboxes/{sandbox_id}/stdout",
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        output_data = await response.json()
-                        output = output_data.get("stdout", "")
-                    else:
-                        output = "No output available"
-                
-                # Get any errors
-                async with session.get(
-                    f"{self.base_url}/sandboxes/{sandbox_id}/stderr",
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        error_data = await response.json()
-                        error = error_data.get("stderr", "")
-                    else:
-                        error = None
-                
-                # For static content, get the preview URL
-                if template == "static":
-                    preview_url = f"https://{sandbox_id}.e2b.dev"
-                    output = f"Preview available at: {preview_url}\n\n{output}"
-                
-                # Terminate sandbox
-                await session.delete(
-                    f"{self.base_url}/sandboxes/{sandbox_id}",
-                    headers=headers
-                )
-                
-                return {
-                    "output": output,
-                    "error": error,
-                    "success": True,
-                    "preview_url": preview_url if template == "static" else None
-                }
-                
-            except Exception as e:
-                return {
-                    "output": "",
-                    "error": f"Sandbox execution error: {str(e)}",
-                    "success": False
-                }
+            
+            started = time.perf_counter()
+            phases(backend_name, template, "create").observe(started - phase_started)
+            collected = {"stdout": [], "stderr": []}
+            partial = {"stdout": "", "stderr": ""}
+            timed_out = False
+            try:
+                async for stream, text in self._follow_output(sandbox_id, template, live):
+                    collected[stream].append(text)
+                    if live:
+                        *lines, partial[stream] = (partial[stream] + text).split("\n")
+                        for line in lines:
+                            yield stream, line + "\n"
+            except asyncio.TimeoutError:
+                timed_out = True
+            execution_time = time.perf_counter() - started
+            phases(backend_name, template, "run").observe(execution_time)
+            
+            if live:
+                for stream, rest in partial.items():
+                    if rest:
+                        yield stream, rest
+            
+            output = "".join(collected["stdout"])
+            error = "".join(collected["stderr"])
+            
+            # For static content, get the preview URL
+            preview_url = None
+            if template == "static":
+                preview_url = f"https://{sandbox_id}.e2b.dev"
+                output = f"Preview available at: {preview_url}\n\n{output}"
+            
+            if timed_out:
+                error = f"{error}Execution timed out after {self.exec_timeout:g}s"
+            
+            reusable = not timed_out
+            yield "result", {
+                "output": output,
+                "error": error,
+                "execution_time": execution_time,
+                "success": not timed_out,
+                "preview_url": preview_url
+            }
+            
+        except Exception as e:
+            yield "result", {
+                "output": "",
+                "error": f"Sandbox execution error: {str(e)}",
+                "success": False
+            }
+        finally:
+            phase_started = time.perf_counter()
+            if sandbox is not None:
+                await self.pool.release(sandbox, reusable=reusable)
+            elif sandbox_id is not None:
+                # Terminate sandbox (the response is released so the connection is reused)
+                try:
+                    await self.delete_sandbox(sandbox_id)
+                except Exception:
+                    pass
+            if sandbox_id is not None:
+                phases(backend_name, template, "teardown").observe(time.perf_counter() - phase_started)
+    
+    async def _follow_output(self, sandbox_id: str, template: str, live: bool) -> AsyncGenerator[Tuple[str, str], None]:
+        """Poll with adaptive backoff until the process exits, yielding new stdout/stderr text.
+        
+        Output is only fetched on exit unless ``live`` is set. Raises
+        asyncio.TimeoutError after SANDBOX_EXEC_TIMEOUT, once whatever was
+        produced so far has been yielded.
+        """
+        offsets = {"stdout": 0, "stderr": 0}
+        delay = self.poll_initial
+        deadline = time.monotonic() + self.exec_timeout
+        while True:
+            # Static previews are served rather than run to completion
+            finished = template == "static" or await self._process_exited(sandbox_id)
+            timed_out = not finished and time.monotonic() >= deadline
+            if live or finished or timed_out:
+                for stream in offsets:
+                    text = await self._read_stream(sandbox_id, stream)
+                    if len(text) > offsets[stream]:
+                        yield stream, text[offsets[stream]:]
+                        offsets[stream] = len(text)
+            if finished:
+                return
+            if timed_out:
+                raise asyncio.TimeoutError
+            await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 2, self.poll_max)
+    
+    async def _process_exited(self, sandbox_id: str) -> bool:
+        session = await self._get_session()
+        async with session.get(
+            f"{self.base_url}/sandboxes/{sandbox_id}",
+            headers=self._headers()
+        ) as response:
+            if response.status != 200:
+                # Gone or unknown: there is nothing left to wait for
+                return True
+            data = await response.json()
+        return data.get("status", "exited") != "running"
+    
+    async def _read_stream(self, sandbox_id: str, stream: str) -> str:
+        session = await self._get_session()
+        async with session.get(
+            f"{self.base_url}/sandboxes/{sandbox_id}/{stream}",
+            headers=self._headers()
+        ) as response:
+            if response.status != 200:
+                return ""
+            return (await response.json()).get(stream, "")
+    
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"backend": "local" if self.backend is not None else "e2b"}
+        if self.result_cache is not None:
+            stats["result_cache"] = self.result_cache.stats()
+        if self.pool is not None:
+            stats["pool"] = self.pool.stats()
+        if self.backend is not None:
+            stats["local"] = self.backend.stats()
+        return stats
     
     def _create_html_file(self, code: str) -> str:
         """Create a complete HTML file from code"""
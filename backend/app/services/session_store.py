@@ -0,0 +1,253 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+class SessionLog:
+    """Append-only message log for one session, bounded by count and bytes"""
+
+    def __init__(self, max_messages: int, max_bytes: int):
+        self.messages: Deque[Dict[str, Any]] = deque(maxlen=max_messages)
+        self.artifacts: Deque[Dict[str, Any]] = deque(maxlen=max_messages)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.last_access = time.monotonic()
+
+    @staticmethod
+    def _sizeof(message: Dict[str, Any]) -> int:
+        return len(message.get("content") or "")
+
+    def append(self, message: Dict[str, Any]) -> None:
+        if len(self.messages) == self.messages.maxlen:
+            self.size -= self._sizeof(self.messages[0])
+        self.messages.append(message)
+        self.size += self._sizeof(message)
+        # Drop the oldest turns once the byte cap is exceeded, but keep the newest
+        while self.size > self.max_bytes and len(self.messages) > 1:
+            self.size -= self._sizeof(self.messages.popleft())
+
+    def tail(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        if limit is None or limit >= len(self.messages):
+            return list(self.messages)
+        if limit <= 0:
+            return []
+        start = len(self.messages) - limit
+        return [self.messages[i] for i in range(start, len(self.messages))]
+
+
+class SQLiteSessionStore:
+    """Durable append-only message log in SQLite (WAL mode)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id TEXT NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " extra TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)")
+
+    def append(self, session_id: str, message: Dict[str, Any]) -> None:
+        extra = {k: v for k, v in message.items() if k not in ("role", "content", "created_at")}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages (session_id, role, content, created_at, extra) VALUES (?, ?, ?, ?, ?)",
+                (session_id, message["role"], message["content"], message["created_at"], json.dumps(extra) if extra else None),
+            )
+
+    def tail(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, created_at, extra FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit),
+            ).fetchall()
+        messages = []
+        for role, content, created_at, extra in reversed(rows):
+            message = {"role": role, "content": content, "created_at": created_at}
+            if extra:
+                message.update(json.loads(extra))
+            messages.append(message)
+        return messages
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SessionStore:
+    """In-memory ring buffers per session with an optional SQLite durable tier.
+
+    Appends are O(1); idle sessions and the least recently used sessions beyond
+    ``max_sessions`` are evicted from memory and reloaded from SQLite on demand.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = 200,
+        max_session_bytes: int = 1_000_000,
+        max_sessions: int = 10_000,
+        idle_ttl: float = 3600.0,
+        db_path: Optional[str] = None,
+    ):
+        self.max_messages = max_messages
+        self.max_session_bytes = max_session_bytes
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.durable = SQLiteSessionStore(db_path) if db_path else None
+        self._sessions: "OrderedDict[str, SessionLog]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        return cls(
+            max_messages=int(os.getenv("MEMORY_MAX_MESSAGES", "200")),
+            max_session_bytes=int(os.getenv("MEMORY_MAX_SESSION_BYTES", "1000000")),
+            max_sessions=int(os.getenv("MEMORY_MAX_SESSIONS", "10000")),
+            idle_ttl=float(os.getenv("MEMORY_SESSION_IDLE_TTL", "3600")),
+            db_path=os.getenv("MEMORY_DB_PATH") or None,
+        )
+
+    def _session(self, session_id: str, create: bool = True) -> Optional[SessionLog]:
+        log = self._sessions.get(session_id)
+        if log is None:
+            if not create and self.durable is None:
+                return None
+            log = SessionLog(self.max_messages, self.max_session_bytes)
+            if self.durable is not None:
+                for message in self.durable.tail(session_id, self.max_messages):
+                    log.append(message)
+                if not create and not log.messages:
+                    return None
+            self._sessions[session_id] = log
+        self._sessions.move_to_end(session_id)
+        log.last_access = time.monotonic()
+        self._evict()
+        return log
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._sessions:
+            session_id, log = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions or now - log.last_access > self.idle_ttl:
+                del self._sessions[session_id]
+            else:
+                break
+
+    async def append(self, session_id: str, role: str, content: str, **extra: Any) -> Dict[str, Any]:
+        message = {"role": role, "content": content, "created_at": time.time(), **extra}
+        with self._lock:
+            self._session(session_id).append(message)
+        if self.durable is not None:
+            self.durable.append(session_id, message)
+        return message
+
+    async def tail(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return the last ``limit`` messages (all retained messages if None)"""
+        with self._lock:
+            log = self._session(session_id, create=False)
+            return log.tail(limit) if log else []
+
+    async def has_session(self, session_id: str) -> bool:
+        with self._lock:
+            return self._session(session_id, create=False) is not None
+
+    async def add_artifact(self, session_id: str, artifact: Dict[str, Any]) -> None:
+        with self._lock:
+            self._session(session_id).artifacts.append(artifact)
+
+    async def artifacts(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            log = self._session(session_id, create=False)
+            return list(log.artifacts) if log else []
+
+    async def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.durable is not None:
+            self.durable.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(log.size for log in self._sessions.values()),
+                "durable": self.durable is not None,
+            }
+
+
+class SharedSessionStore:
+    """SessionStore backed entirely by a shared state backend.
+
+    Nothing is cached in-process, so every worker sees the same history and
+    requests for a session can land on any worker. Commands run on the
+    backend's command thread, never on the event loop.
+    """
+
+    def __init__(self, shared: Any, max_messages: int = 200, idle_ttl: float = 3600.0):
+        self.shared = shared
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+
+    @classmethod
+    def from_env(cls, shared: Any) -> "SharedSessionStore":
+        return cls(
+            shared,
+            max_messages=int(os.getenv("MEMORY_MAX_MESSAGES", "200")),
+            idle_ttl=float(os.getenv("MEMORY_SESSION_IDLE_TTL", "3600")),
+        )
+
+    async def append(self, session_id: str, role: str, content: str, **extra: Any) -> Dict[str, Any]:
+        message = {"role": role, "content": content, "created_at": time.time(), **extra}
+        await self.shared.call(
+            self.shared.rpush,
+            f"session:{session_id}:messages",
+            json.dumps(message).encode(),
+            maxlen=self.max_messages,
+            ttl=self.idle_ttl,
+        )
+        return message
+
+    async def tail(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        if limit is not None and limit <= 0:
+            return []
+        start = -min(limit, self.max_messages) if limit is not None else 0
+        raws = await self.shared.call(self.shared.lrange, f"session:{session_id}:messages", start)
+        return [json.loads(raw) for raw in raws]
+
+    async def has_session(self, session_id: str) -> bool:
+        return await self.shared.call(self.shared.exists, f"session:{session_id}:messages")
+
+    async def add_artifact(self, session_id: str, artifact: Dict[str, Any]) -> None:
+        await self.shared.call(
+            self.shared.rpush,
+            f"session:{session_id}:artifacts",
+            json.dumps(artifact).encode(),
+            maxlen=self.max_messages,
+            ttl=self.idle_ttl,
+        )
+
+    async def artifacts(self, session_id: str) -> List[Dict[str, Any]]:
+        raws = await self.shared.call(self.shared.lrange, f"session:{session_id}:artifacts")
+        return [json.loads(raw) for raw in raws]
+
+    async def clear(self, session_id: str) -> None:
+        await self.shared.call(self.shared.delete, f"session:{session_id}:messages", f"session:{session_id}:artifacts")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"shared": True}
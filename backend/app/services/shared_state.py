@@ -0,0 +1,216 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - only needed for SHARED_STATE_URL=redis://...
+    redis = None
+
+
+class _BackgroundCommands:
+    """Runs a backend's blocking commands on one thread so the event loop never waits on I/O.
+
+    ``call`` awaits a command's result; ``post`` queues a write and returns at
+    once. With a single thread, commands from this worker apply in order, so
+    e.g. a stream's "done" flag never lands before its last frame.
+    """
+
+    def _start_commands(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+        self.failed_writes = 0
+
+    async def call(self, command: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(command, *args, **kwargs))
+
+    def post(self, command: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        self._executor.submit(command, *args, **kwargs).add_done_callback(self._check_write)
+
+    def _check_write(self, future: Future) -> None:
+        if future.exception() is not None:
+            self.failed_writes += 1
+            print(f"Warning: shared state write failed: {future.exception()}")
+
+
+class SQLiteSharedState(_BackgroundCommands):
+    """Key/value and list store shared by worker processes on one host.
+
+    A stand-in for Redis with the same small command set: every worker opens
+    its own connection to the same WAL-mode database file. A list's TTL and
+    length live in one ``list_meta`` row, so a push never rewrites the list.
+    """
+
+    def __init__(self, path: str):
+        self._start_commands()
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lists ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lists_key ON lists (key, seq)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS list_meta (key TEXT PRIMARY KEY, length INTEGER NOT NULL, expires_at REAL)"
+        )
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    def _purge(self) -> None:
+        # Expired rows are filtered on read and swept every so often on write
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            now = time.time()
+            self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM lists WHERE key IN (SELECT key FROM list_meta WHERE expires_at <= ?)", (now,)
+            )
+            self._conn.execute("DELETE FROM list_meta WHERE expires_at <= ?", (now,))
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, self._expiry(ttl)),
+            )
+            self._purge()
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+                self._conn.execute("DELETE FROM lists WHERE key = ?", (key,))
+                self._conn.execute("DELETE FROM list_meta WHERE key = ?", (key,))
+
+    def exists(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)"
+                " UNION ALL SELECT 1 FROM list_meta WHERE key = ? AND length > 0"
+                " AND (expires_at IS NULL OR expires_at > ?) LIMIT 1",
+                (key, now, key, now),
+            ).fetchone()
+        return row is not None
+
+    def rpush(self, key: str, value: bytes, maxlen: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """Append to a list, keeping only the newest maxlen items and refreshing its TTL"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT length, expires_at FROM list_meta WHERE key = ?", (key,)).fetchone()
+                length, expires_at = row if row else (0, None)
+                if expires_at is not None and expires_at <= now:
+                    # Same as Redis: pushing to an expired key starts a new list
+                    self._conn.execute("DELETE FROM lists WHERE key = ?", (key,))
+                    length, expires_at = 0, None
+                self._conn.execute("INSERT INTO lists (key, value) VALUES (?, ?)", (key, value))
+                length += 1
+                if maxlen is not None and length > maxlen:
+                    self._conn.execute(
+                        "DELETE FROM lists WHERE seq IN (SELECT seq FROM lists WHERE key = ? ORDER BY seq LIMIT ?)",
+                        (key, length - maxlen),
+                    )
+                    length = maxlen
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO list_meta (key, length, expires_at) VALUES (?, ?, ?)",
+                    (key, length, self._expiry(ttl) if ttl else expires_at),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._purge()
+
+    def lrange(self, key: str, start: int = 0) -> List[bytes]:
+        """Items from index start to the end; a negative start counts from the end"""
+        with self._lock:
+            meta = self._conn.execute("SELECT expires_at FROM list_meta WHERE key = ?", (key,)).fetchone()
+            if meta is None or (meta[0] is not None and meta[0] <= time.time()):
+                return []
+            if start < 0:
+                rows = self._conn.execute(
+                    "SELECT value FROM lists WHERE key = ? ORDER BY seq DESC LIMIT ?", (key, -start)
+                ).fetchall()
+                rows.reverse()
+            else:
+                rows = self._conn.execute(
+                    "SELECT value FROM lists WHERE key = ? ORDER BY seq LIMIT -1 OFFSET ?", (key, start)
+                ).fetchall()
+        return [row[0] for row in rows]
+
+
+class RedisSharedState(_BackgroundCommands):
+    """The same command set on a Redis (or Redis-protocol compatible) server"""
+
+    def __init__(self, url: str):
+        self._start_commands()
+        if redis is None:
+            raise RuntimeError("SHARED_STATE_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+    def exists(self, key: str) -> bool:
+        return bool(self.client.exists(key))
+
+    def rpush(self, key: str, value: bytes, maxlen: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        pipe = self.client.pipeline()
+        pipe.rpush(key, value)
+        if maxlen is not None:
+            pipe.ltrim(key, -maxlen, -1)
+        if ttl:
+            pipe.pexpire(key, int(ttl * 1000))
+        pipe.execute()
+
+    def lrange(self, key: str, start: int = 0) -> List[bytes]:
+        return self.client.lrange(key, start, -1)
+
+
+def shared_state_from_env():
+    """SHARED_STATE_URL=redis://host:6379/0 or sqlite:///path/to/state.db; None keeps state in-process"""
+    url = os.getenv("SHARED_STATE_URL")
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedState(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedState(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+# Global instance
+shared_state = shared_state_from_env()
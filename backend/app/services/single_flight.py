@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+
+class Flight:
+    """One shared upstream generation and the items it has produced so far"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+
+    def publish(self, item: Any) -> None:
+        self.items.append(item)
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def subscribe(self) -> AsyncGenerator[Any, None]:
+        """Yield everything produced so far, then follow the live generation"""
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                updated = self._updated
+                while index < len(self.items):
+                    yield self.items[index]
+                    index += 1
+                if self.done:
+                    return
+                await updated.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and self.task is not None and not self.task.done():
+                self.task.cancel()
+
+
+class SingleFlight:
+    """Deduplicates concurrent identical generations into one upstream call"""
+
+    def __init__(self):
+        self.flights: Dict[Hashable, Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def run(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Join the in-flight generation for key, starting one with factory if none exists"""
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight()
+            self.flights[key] = flight
+            flight.task = asyncio.create_task(self._drive(key, flight, factory()))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        return flight.subscribe()
+
+    async def _drive(self, key: Hashable, flight: Flight, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                flight.publish(item)
+        finally:
+            flight.finish()
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self.flights), "upstream_calls": self.leaders, "coalesced_requests": self.followers}
@@ -0,0 +1,286 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from app.services.metrics import CHAT_STREAMS_ABANDONED, CHAT_WASTED_TOKENS
+from app.services.shared_state import shared_state
+
+# What happens to a generation once every client has been gone for the cancel delay
+CANCEL = "cancel"
+FINISH = "finish"
+
+
+class ReplayStream:
+    """One in-flight generation: a background task writing id'd frames to a bounded buffer"""
+
+    def __init__(self, key: str, max_frames: int, grace: float, policy: str = CANCEL):
+        self.key = key
+        self.grace = grace
+        self.policy = policy
+        self.frames: Deque[Tuple[int, bytes]] = deque(maxlen=max_frames)
+        self.last_id = 0
+        # Highest frame id any local subscriber has been sent
+        self.delivered_id = 0
+        self.done = False
+        self.abandoned = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        # Builds the (id, frame) appended when the generation is cancelled
+        self.closing_frame: Optional[Callable[[], Tuple[int, bytes]]] = None
+        self.token = uuid.uuid4().hex
+        # Set in shared mode: when a subscriber on another worker last polled this stream
+        self.remote_seen: Optional[Callable[[], Awaitable[float]]] = None
+        self._updated = asyncio.Event()
+        self._grace_timer: Optional[asyncio.TimerHandle] = None
+
+    def append(self, frame_id: int, frame: bytes) -> None:
+        self.frames.append((frame_id, frame))
+        self.last_id = frame_id
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    def _frames_after(self, last_id: int):
+        if not self.frames:
+            return []
+        start = max(0, last_id + 1 - self.frames[0][0])
+        return [self.frames[i] for i in range(start, len(self.frames))]
+
+    async def subscribe(self, last_id: int = 0, heartbeat: Optional[float] = None) -> AsyncGenerator[Optional[bytes], None]:
+        """Replay frames after last_id, then tail the live stream; yields None when idle"""
+        self.subscribers += 1
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+        try:
+            while True:
+                updated = self._updated
+                for frame_id, frame in self._frames_after(last_id):
+                    last_id = frame_id
+                    self.delivered_id = max(self.delivered_id, frame_id)
+                    yield frame
+                if self.done and last_id >= self.last_id:
+                    return
+                try:
+                    await asyncio.wait_for(updated.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._grace_timer = asyncio.get_running_loop().call_later(self.grace, self._abandon)
+
+    def _abandon(self) -> None:
+        self._grace_timer = None
+        if self.remote_seen is not None:
+            # Asking shared state whether another worker is still reading means I/O
+            asyncio.ensure_future(self._abandon_unless_seen())
+            return
+        self._give_up()
+
+    async def _abandon_unless_seen(self) -> None:
+        idle = time.time() - await self.remote_seen()
+        if self.subscribers > 0:
+            return
+        if idle < self.grace:
+            self._grace_timer = asyncio.get_running_loop().call_later(self.grace - idle, self._abandon)
+            return
+        self._give_up()
+
+    def _give_up(self) -> None:
+        """Cancel (or, with the finish policy, leave running) a generation nobody reconnected to"""
+        if self.subscribers == 0 and self.task is not None and not self.task.done():
+            self.abandoned = True
+            if self.policy == CANCEL:
+                self.task.cancel()
+
+    def undelivered_tokens(self) -> int:
+        """Estimated tokens in frames no local subscriber was sent"""
+        size = sum(len(frame) for frame_id, frame in self.frames if frame_id > self.delivered_id)
+        return (size + 3) // 4
+
+    def cancel(self) -> None:
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+
+class SharedReplayStream:
+    """Read side of a generation running on another worker, polled from shared state"""
+
+    def __init__(self, key: str, token: str, shared: Any, poll_interval: float = 0.05):
+        self.key = key
+        self.prefix = f"stream:{key}:{token}"
+        self.shared = shared
+        self.poll_interval = poll_interval
+
+    def _poll(self, offset: int, read_id: int) -> Tuple[bool, int, List[Tuple[int, bytes]]]:
+        """(done, new offset, frames) from ``offset`` on, re-reading the frame before it.
+
+        The mirror keeps only the newest frames, so if the frame at ``offset - 1``
+        is no longer ``read_id`` the list was trimmed and is scanned from the start.
+        """
+        self.shared.set(f"{self.prefix}:seen", str(time.time()).encode(), ttl=StreamRegistry.shared_ttl)
+        # Read the done flag first: it is only set after the last frame was pushed
+        done = self.shared.exists(f"{self.prefix}:done")
+        start = max(0, offset - 1)
+        items = self.shared.lrange(f"{self.prefix}:frames", start)
+        if offset and (not items or int(items[0].split(b"\n", 1)[0]) != read_id):
+            start, items = 0, self.shared.lrange(f"{self.prefix}:frames", 0)
+        frames = []
+        for item in items:
+            frame_id, frame = item.split(b"\n", 1)
+            frames.append((int(frame_id), frame))
+        return done, start + len(items), frames
+
+    async def subscribe(self, last_id: int = 0, heartbeat: Optional[float] = None) -> AsyncGenerator[Optional[bytes], None]:
+        offset = 0
+        read_id = 0
+        idle = 0.0
+        while True:
+            done, offset, frames = await self.shared.call(self._poll, offset, read_id)
+            previous = read_id
+            for frame_id, frame in frames:
+                read_id = frame_id
+                if frame_id > last_id:
+                    last_id = frame_id
+                    yield frame
+            if done:
+                return
+            if read_id != previous:
+                idle = 0.0
+                continue
+            await asyncio.sleep(self.poll_interval)
+            idle += self.poll_interval
+            if heartbeat is not None and idle >= heartbeat:
+                idle = 0.0
+                yield None
+
+
+class StreamRegistry:
+    """Per-session replay buffers so a dropped client can resume with Last-Event-ID.
+
+    With a shared state backend, frames are also mirrored there under a
+    per-generation token so a client can resume on any worker, not only the
+    one running the generation.
+    """
+
+    # How long mirrored frames outlive their last write
+    shared_ttl = 600.0
+
+    def __init__(
+        self,
+        max_frames: int = 4096,
+        grace: float = 30.0,
+        shared: Any = None,
+        cancel_after: float = 5.0,
+        policy: str = CANCEL,
+    ):
+        if policy not in (CANCEL, FINISH):
+            raise ValueError(f"Unsupported disconnect policy: {policy}")
+        self.max_frames = max_frames
+        self.grace = grace
+        self.shared = shared
+        self.cancel_after = cancel_after
+        self.policy = policy
+        self.streams: Dict[str, ReplayStream] = {}
+
+    @classmethod
+    def from_env(cls) -> "StreamRegistry":
+        return cls(
+            max_frames=int(os.getenv("STREAM_REPLAY_FRAMES", "4096")),
+            grace=float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "30")),
+            shared=shared_state,
+            cancel_after=float(os.getenv("STREAM_CANCEL_AFTER_SECONDS", "5")),
+            policy=os.getenv("STREAM_DISCONNECT_POLICY", CANCEL),
+        )
+
+    def start(
+        self,
+        key: str,
+        frames: AsyncIterator[Tuple[int, bytes]],
+        closing_frame: Optional[Callable[[], Tuple[int, bytes]]] = None,
+    ) -> ReplayStream:
+        """Run a generation detached from any HTTP connection, replacing an older one.
+
+        Once no client has been attached for ``cancel_after`` seconds the
+        generation is cancelled (policy "cancel") or left to finish so its
+        answer is still stored and cached (policy "finish"). A cancelled
+        stream ends with ``closing_frame()`` for clients resuming late.
+        """
+        previous = self.streams.get(key)
+        if previous is not None:
+            previous.cancel()
+        stream = ReplayStream(key, self.max_frames, self.cancel_after, self.policy)
+        stream.closing_frame = closing_frame
+        if self.shared is not None:
+            self.shared.post(self.shared.set, f"stream:{key}:owner", stream.token.encode(), ttl=self.shared_ttl)
+            stream.remote_seen = lambda: self._remote_seen(stream)
+        self.streams[key] = stream
+        stream.task = asyncio.create_task(self._run(stream, frames))
+        return stream
+
+    def _append(self, stream: ReplayStream, frame_id: int, frame: bytes) -> None:
+        stream.append(frame_id, frame)
+        if self.shared is not None:
+            self.shared.post(
+                self.shared.rpush,
+                f"stream:{stream.key}:{stream.token}:frames",
+                b"%d\n%s" % (frame_id, frame),
+                maxlen=self.max_frames,
+                ttl=self.shared_ttl,
+            )
+
+    async def _run(self, stream: ReplayStream, frames: AsyncIterator[Tuple[int, bytes]]) -> None:
+        cancelled = False
+        try:
+            async for frame_id, frame in frames:
+                self._append(stream, frame_id, frame)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if stream.abandoned:
+                action = "cancelled" if stream.policy == CANCEL else "finished"
+                CHAT_STREAMS_ABANDONED.labels(action).inc()
+                CHAT_WASTED_TOKENS.labels(action).inc(stream.undelivered_tokens())
+            if cancelled and stream.closing_frame is not None:
+                self._append(stream, *stream.closing_frame())
+            stream.finish()
+            if self.shared is not None:
+                self.shared.post(self.shared.set, f"stream:{stream.key}:{stream.token}:done", b"1", ttl=self.shared_ttl)
+            # Keep the finished buffer around for late reconnects
+            asyncio.get_running_loop().call_later(self.grace, self._expire, stream)
+
+    def _expire(self, stream: ReplayStream) -> None:
+        if self.streams.get(stream.key) is stream:
+            del self.streams[stream.key]
+
+    async def _remote_seen(self, stream: ReplayStream) -> float:
+        seen = await self.shared.call(self.shared.get, f"stream:{stream.key}:{stream.token}:seen")
+        return float(seen) if seen else 0.0
+
+    async def get(self, key: str):
+        """The local stream for key, or a shared reader if another worker owns the latest one"""
+        stream = self.streams.get(key)
+        if self.shared is None:
+            return stream
+        owner = await self.shared.call(self.shared.get, f"stream:{key}:owner")
+        if stream is not None and (owner is None or owner.decode() == stream.token):
+            return stream
+        if owner is not None:
+            return SharedReplayStream(key, owner.decode(), self.shared)
+        return None
+
+
+# Global instance
+stream_registry = StreamRegistry.from_env()
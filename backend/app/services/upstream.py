@@ -0,0 +1,238 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Deque, Dict, Optional
+
+from app.services.cache import TTLCache
+
+# HTTP statuses (as carried by google.api_core errors' ``code``) worth retrying
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+_EXHAUSTED = object()
+
+
+class RateLimited(Exception):
+    """Raised when a key's bucket would not refill within the allowed wait"""
+
+
+class TokenBucket:
+    """``rate`` requests per second on average, with bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def reserve(self) -> float:
+        """Take a token now, possibly going into debt; returns how long to wait before using it"""
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    """A token bucket per API key; a rate of 0 disables limiting"""
+
+    def __init__(self, rate: float = 0.0, burst: int = 10, max_wait: float = 10.0, max_keys: int = 1024):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.buckets = TTLCache(max_entries=max_keys, ttl=3600)
+        self.throttled = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            rate=float(os.getenv("GEMINI_RATE_LIMIT_RPS", "0")),
+            burst=int(os.getenv("GEMINI_RATE_LIMIT_BURST", "10")),
+            max_wait=float(os.getenv("GEMINI_RATE_LIMIT_MAX_WAIT", "10")),
+        )
+
+    def _bucket(self, key: str) -> TokenBucket:
+        return self.buckets.get_or_create(key, lambda: TokenBucket(self.rate, self.burst))
+
+    async def acquire(self, key: str) -> None:
+        """Wait for the key's next token; raises RateLimited if that is more than max_wait away"""
+        if self.rate <= 0:
+            return
+        bucket = self._bucket(key)
+        if bucket.try_acquire():
+            return
+        # Estimate before committing so a rejected request doesn't consume a token
+        bucket._refill()
+        wait = (1 - bucket.tokens) / self.rate
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise RateLimited(f"Rate limit for this API key reached, retry in {wait:.0f}s")
+        self.throttled += 1
+        await asyncio.sleep(bucket.reserve())
+
+    def try_acquire(self, key: str) -> bool:
+        """Take a token only if one is available right away (used for optional extra requests)"""
+        return self.rate <= 0 or self._bucket(key).try_acquire()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rate": self.rate, "burst": self.burst, "throttled": self.throttled, "rejected": self.rejected}
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for errors raised before any output"""
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "2")),
+            base_delay=float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8")),
+        )
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+            return True
+        return getattr(error, "code", None) in RETRYABLE_CODES
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to sleep before retry number ``attempt`` (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class Hedger:
+    """Decides when to fire a duplicate request for a stream that hasn't started.
+
+    The deadline is a percentile of recently observed first-token latencies
+    (``initial_delay`` until ``min_samples`` have been seen), never below
+    ``min_delay``.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 95.0,
+        initial_delay: float = 3.0,
+        min_delay: float = 0.5,
+        min_samples: int = 20,
+        window: int = 256,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls) -> "Hedger":
+        return cls(
+            enabled=os.getenv("GEMINI_HEDGE_ENABLED", "0") not in ("0", "false", "False", ""),
+            percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95")),
+            initial_delay=float(os.getenv("GEMINI_HEDGE_INITIAL_DELAY", "3")),
+            min_delay=float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "0.5")),
+        )
+
+    def observe(self, first_token_seconds: float) -> None:
+        self.samples.append(first_token_seconds)
+
+    def deadline(self) -> Optional[float]:
+        if not self.enabled:
+            return None
+        if len(self.samples) < self.min_samples:
+            return max(self.min_delay, self.initial_delay)
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    async def race(
+        self,
+        start: Callable[[], AsyncIterator[Any]],
+        can_hedge: Callable[[], bool],
+    ) -> AsyncGenerator[Any, None]:
+        """Stream from ``start()``, adding one hedge if nothing arrives by the deadline.
+
+        Whichever attempt produces its first item first is kept and the other
+        is cancelled. An attempt that fails before producing anything leaves
+        the other to carry on; the error surfaces only if both fail.
+        """
+        started = time.perf_counter()
+        deadline = self.deadline()
+        streams = [start()]
+        pending: Dict[asyncio.Future, AsyncIterator[Any]] = {asyncio.ensure_future(streams[0].__anext__()): streams[0]}
+        winner = None
+        first: Any = _EXHAUSTED
+        error: Optional[BaseException] = None
+        try:
+            while winner is None:
+                timeout = None if deadline is None or len(streams) > 1 else max(0.0, started + deadline - time.perf_counter())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Hedge at most once, and only with spare quota for the key
+                    deadline = None
+                    if can_hedge():
+                        self.hedges += 1
+                        streams.append(start())
+                        pending[asyncio.ensure_future(streams[-1].__anext__())] = streams[-1]
+                    continue
+                for future in done:
+                    stream = pending.pop(future)
+                    if future.exception() is None:
+                        if winner is None:
+                            winner, first = stream, future.result()
+                        continue
+                    if isinstance(future.exception(), StopAsyncIteration):
+                        if winner is None:
+                            winner = stream
+                        continue
+                    error = future.exception()
+                if winner is None and not pending:
+                    raise error
+        finally:
+            for future in pending:
+                future.cancel()
+            # A generator can only be closed once its cancelled __anext__ has unwound
+            await asyncio.gather(*pending, return_exceptions=True)
+            for stream in streams:
+                if stream is not winner:
+                    await stream.aclose()
+
+        if winner is not streams[0]:
+            self.hedge_wins += 1
+        if first is _EXHAUSTED:
+            return
+        self.observe(time.perf_counter() - started)
+        try:
+            yield first
+            async for item in winner:
+                yield item
+        finally:
+            await winner.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "deadline": self.deadline(),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
@@ -0,0 +1,201 @@
+"""
+Micro-benchmark: incremental artifact parser vs. the previous regex loop.
+
+Builds synthetic responses of a few hundred KB ("mixed": prose with many
+artifacts, "single": long prose then one huge artifact), splits them into
+model-sized chunks and times both parsers.
+
+    cd backend && python -m benchmarks.artifact_parser --sizes 100,300,600 --chunk 40
+
+With --fuzz N it instead checks correctness: N random responses (look-alike
+tags such as "<artifacts>", stray "<", truncated tags and bodies) are split
+at random points and the parser's output must match a regex reference
+parse of the whole text. Exits 1 on the first mismatch.
+
+    cd backend && python -m benchmarks.artifact_parser --fuzz 2000
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from app.services.artifact_parser import (
+    ARTIFACT_DELTA,
+    ARTIFACT_END,
+    ARTIFACT_START,
+    TEXT,
+    ArtifactStreamParser,
+)
+
+# Building blocks for fuzzed responses
+FUZZ_PIECES = [
+    "Here is the code.\n",
+    "see the <artifacts> folder ",
+    "<artifactory url> ",
+    "a < b and c > d ",
+    "<art",
+    "</artifact",
+    "</artifact>",
+    "x <artifact",
+    '<artifact type="code" language="python" title="Main">\nprint(1 < 2)\n</artifact>\n',
+    '<artifact\ttype="code" language="js" title="T">\nif (a > b) {}\n</artifact>',
+    "<artifact>bare body</artifact>",
+    '<artifact type="code" language="go" title="Cut">\nfunc main() {',
+    '<artifact type="code" title="Open',
+]
+REFERENCE_PATTERN = re.compile(r"<artifact(?=[\s>])([^>]*)>(.*?)(?:</artifact>|\Z)", re.DOTALL)
+
+
+def synthetic_response(target_kb: int, shape: str = "mixed") -> str:
+    if shape == "single":
+        # Long prose followed by one very large artifact
+        half = target_kb * 512
+        prose = ("- A long explanation line that keeps going.\n" * (half // 44 + 1))[:half]
+        body = "".join(f"    value_{i} = compute({i})\n" for i in range(half // 28 + 1))[:half]
+        return f'{prose}<artifact type="code" language="python" title="Big">\n{body}</artifact>\n'
+    prose = "- This explains the approach in a sentence or two.\n" * 20
+    code = "".join(f"    value_{i} = compute({i})  # step {i}\n" for i in range(200))
+    parts = []
+    index = 0
+    while sum(len(p) for p in parts) < target_kb * 1024:
+        parts.append(prose)
+        parts.append(f'<artifact type="code" language="python" title="Block {index}">\n{code}</artifact>\n')
+        index += 1
+    return "".join(parts)
+
+
+def chunked(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def legacy(chunks):
+    """The loop previously inlined in generate_response_stream"""
+    full_response = ""
+    artifact_buffer = ""
+    in_artifact = False
+    found = 0
+    for text in chunks:
+        full_response += text
+        artifact_buffer += text
+        if "<artifact" in artifact_buffer and not in_artifact:
+            start_match = re.search(r'<artifact[^>]*>', artifact_buffer)
+            if start_match:
+                in_artifact = True
+                artifact_start = artifact_buffer.find(start_match.group())
+                artifact_buffer = artifact_buffer[artifact_start:]
+        if in_artifact and "</artifact>" in artifact_buffer:
+            end_pos = artifact_buffer.find("</artifact>") + len("</artifact>")
+            artifact_xml = artifact_buffer[:end_pos]
+            artifact_buffer = artifact_buffer[end_pos:]
+            attr = re.search(r'<artifact[^>]*type=\"([^\"]*)\"[^>]*language=\"([^\"]*)\"[^>]*title=\"([^\"]*)\"[^>]*>', artifact_xml)
+            body = re.search(r'<artifact[^>]*>(.*?)</artifact>', artifact_xml, re.DOTALL)
+            if attr and body:
+                found += 1
+            in_artifact = False
+    return found
+
+
+def incremental(chunks):
+    parser = ArtifactStreamParser()
+    parts = []
+    found = 0
+    for text in chunks:
+        parts.append(text)
+        for event in parser.feed(text):
+            if event.kind == ARTIFACT_END:
+                found += 1
+    parser.finish()
+    "".join(parts)
+    return found
+
+
+def _time(fn, chunks, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(chunks)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def reference(text: str):
+    """[("text", str) | ("artifact", attrs, code)] for a complete response"""
+    parts = []
+    pos = 0
+    for match in REFERENCE_PATTERN.finditer(text):
+        if match.start() > pos:
+            parts.append(("text", text[pos:match.start()]))
+        attrs = dict(re.findall(r'(\w+)="([^"]*)"', match.group(1)))
+        parts.append(("artifact", attrs, match.group(2).strip()))
+        pos = match.end()
+    if pos < len(text):
+        parts.append(("text", text[pos:]))
+    return parts
+
+
+def streamed(chunks):
+    """The same shape built from the parser's events"""
+    parser = ArtifactStreamParser()
+    events = [event for chunk in chunks for event in parser.feed(chunk)] + parser.finish()
+    parts = []
+    body = []
+    for event in events:
+        if event.kind == TEXT:
+            if parts and parts[-1][0] == "text":
+                parts[-1] = ("text", parts[-1][1] + event.text)
+            else:
+                parts.append(("text", event.text))
+        elif event.kind == ARTIFACT_START:
+            body = []
+        elif event.kind == ARTIFACT_DELTA:
+            body.append(event.text)
+        elif event.kind == ARTIFACT_END:
+            parts.append(("artifact", event.attrs, "".join(body).strip()))
+    return parts
+
+
+def fuzz(cases: int, seed: int) -> bool:
+    rng = random.Random(seed)
+    for case in range(cases):
+        text = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(1, 12)))
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 20)))) if len(text) > 1 else []
+        chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        expected, got = reference(text), streamed(chunks)
+        if got != expected:
+            print(f"case {case}: mismatch for chunks {chunks!r}")
+            print(f"  expected {expected!r}")
+            print(f"  got      {got!r}")
+            return False
+    print(f"{cases} fuzzed responses parsed identically across random chunk splits")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,300,600", help="Response sizes in KB")
+    parser.add_argument("--chunk", type=int, default=40, help="Characters per streamed chunk")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fuzz", type=int, default=0, help="Check N random responses instead of timing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.fuzz:
+        sys.exit(0 if fuzz(args.fuzz, args.seed) else 1)
+
+    print(f"{'shape':>8} {'size':>8} {'chunks':>8} {'legacy':>10} {'incremental':>12} {'artifacts':>10}")
+    for shape in ("mixed", "single"):
+        for size in (int(s) for s in args.sizes.split(",")):
+            chunks = chunked(synthetic_response(size, shape), args.chunk)
+            legacy_time, legacy_found = _time(legacy, chunks, args.repeat)
+            new_time, new_found = _time(incremental, chunks, args.repeat)
+            found = f"{new_found}" if new_found == legacy_found else f"{new_found}!={legacy_found}"
+            print(
+                f"{shape:>8} {size:>6}KB {len(chunks):>8} {legacy_time * 1000:>8.1f}ms "
+                f"{new_time * 1000:>10.1f}ms {found:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Helpers shared by the benchmark scripts."""
+import asyncio
+import contextlib
+import subprocess
+import sys
+import time
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def wait_for_port(host: str, port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"fake server did not start on {host}:{port}")
+
+
+@contextlib.contextmanager
+def fake_server(module: str, host: str, port: int, *args: str):
+    """Run one of the fake servers in a subprocess for the duration of the block"""
+    server = subprocess.Popen([sys.executable, "-m", module, "--host", host, "--port", str(port), *args])
+    try:
+        asyncio.run(wait_for_port(host, port))
+        yield server
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def rss_mb(pid: int) -> float:
+    """Resident set size of a process in MiB (Linux /proc; 0.0 where unavailable)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
@@ -0,0 +1,125 @@
+"""
+Local stand-in for the e2b REST endpoints SandboxService calls.
+
+Implements create / stdout / stderr / delete with configurable latencies, plus
+the files / run / reset / status calls the warm sandbox pool uses. Processes
+"run" for --run-time seconds, printing --output-lines lines evenly over it.
+Point the backend at it with:
+
+    E2B_API_URL=http://127.0.0.1:8766 E2B_API_KEY=fake
+
+Run standalone:
+
+    python -m benchmarks.fake_e2b --port 8766 --create-latency 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from aiohttp import web
+
+
+def create_app(
+    create_latency: float = 0.05,
+    io_latency: float = 0.005,
+    run_time: float = 0.0,
+    output_lines: int = 1,
+) -> web.Application:
+    counter = itertools.count(1)
+    sandboxes = {}
+
+    def start(sandbox: dict, path: str) -> None:
+        sandbox.update(path=path, started=time.monotonic())
+
+    def progress(sandbox: dict) -> float:
+        # Fraction of the simulated run_time elapsed, 1.0 once the process has exited
+        if sandbox["started"] is None:
+            return 0.0
+        if run_time <= 0:
+            return 1.0
+        return min(1.0, (time.monotonic() - sandbox["started"]) / run_time)
+
+    async def create(request: web.Request) -> web.Response:
+        payload = await request.json()
+        await asyncio.sleep(create_latency)
+        sandbox_id = f"sbx-{next(counter)}"
+        sandboxes[sandbox_id] = {"path": None, "started": None}
+        if payload.get("files"):
+            start(sandboxes[sandbox_id], payload["files"][0].get("path", "main"))
+        return web.json_response({"id": sandbox_id})
+
+    async def info(request: web.Request) -> web.Response:
+        sandbox = sandboxes.get(request.match_info["sandbox_id"])
+        if sandbox is None:
+            return web.json_response({"error": "not found"}, status=404)
+        running = sandbox["started"] is not None and progress(sandbox) < 1.0
+        return web.json_response({"status": "running" if running else "exited", "exit_code": None if running else 0})
+
+    async def files(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(io_latency)
+        if request.match_info["sandbox_id"] not in sandboxes:
+            return web.json_response({"error": "not found"}, status=404)
+        return web.json_response({})
+
+    async def run(request: web.Request) -> web.Response:
+        payload = await request.json()
+        await asyncio.sleep(io_latency)
+        sandbox = sandboxes.get(request.match_info["sandbox_id"])
+        if sandbox is None:
+            return web.json_response({"error": "not found"}, status=404)
+        start(sandbox, payload.get("path", "main"))
+        return web.json_response({})
+
+    async def reset(request: web.Request) -> web.Response:
+        await asyncio.sleep(io_latency)
+        sandbox = sandboxes.get(request.match_info["sandbox_id"])
+        if sandbox is None:
+            return web.json_response({"error": "not found"}, status=404)
+        sandbox.update(path=None, started=None)
+        return web.json_response({})
+
+    async def stream(request: web.Request) -> web.Response:
+        await asyncio.sleep(io_latency)
+        sandbox = sandboxes.get(request.match_info["sandbox_id"])
+        if sandbox is None:
+            return web.json_response({"error": "not found"}, status=404)
+        name = request.match_info["stream"]
+        text = ""
+        if name == "stdout" and sandbox["started"] is not None:
+            # Lines appear evenly over the run so streaming clients see progress
+            emitted = int(progress(sandbox) * output_lines)
+            text = "".join(f"ran {sandbox['path']}\n" if output_lines == 1 else f"ran {sandbox['path']} [{i}]\n" for i in range(emitted))
+        return web.json_response({name: text})
+
+    async def delete(request: web.Request) -> web.Response:
+        sandboxes.pop(request.match_info["sandbox_id"], None)
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post("/sandboxes", create)
+    app.router.add_get("/sandboxes/{sandbox_id}", info)
+    app.router.add_delete("/sandboxes/{sandbox_id}", delete)
+    app.router.add_get("/sandboxes/{sandbox_id}/{stream:stdout|stderr}", stream)
+    app.router.add_post("/sandboxes/{sandbox_id}/files", files)
+    app.router.add_post("/sandboxes/{sandbox_id}/run", run)
+    app.router.add_post("/sandboxes/{sandbox_id}/reset", reset)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake e2b sandbox server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--create-latency", type=float, default=0.05)
+    parser.add_argument("--io-latency", type=float, default=0.005)
+    parser.add_argument("--run-time", type=float, default=0.0, help="simulated process duration")
+    parser.add_argument("--output-lines", type=int, default=1)
+    args = parser.parse_args()
+    app = create_app(args.create_latency, args.io_latency, args.run_time, args.output_lines)
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Local stand-in for the Gemini API used by the benchmarks.
+
+Serves ``GenerateContent`` and ``StreamGenerateContent`` over gRPC, the
+transport GeminiService streams through, with a configurable
+time-to-first-token and token rate. Each chunk is sent as soon as it is
+produced. A fraction of requests can fail with an error status
+(--error-rate/--error-status, given as the HTTP code) or start slowly
+(--slow-rate/--slow-ttft) to exercise retries and hedging. Point the backend
+at it with:
+
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765
+
+Run standalone:
+
+    python -m benchmarks.fake_gemini --port 8765 --ttft 0.2 --tokens 50 --interval 0.02
+"""
+import argparse
+import asyncio
+import random
+
+import grpc
+
+
+DEFAULT_TEXT = (
+    "- Reverse the list in place by re-pointing each node.\n"
+    "- Time Complexity: O(n)\n"
+    "- Space Complexity: O(1)\n"
+    "<artifact type=\"code\" language=\"python\" title=\"Reverse Linked List\">\n"
+    "def reverse(head):\n"
+    "    prev = None\n"
+    "    while head:\n"
+    "        head.next, prev, head = prev, head, head.next\n"
+    "    return prev\n"
+    "</artifact>\n"
+)
+
+
+def _tokens(text: str, count: int):
+    """Split text into roughly `count` pieces"""
+    size = max(1, len(text) // max(1, count))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# HTTP statuses accepted by --error-status and the gRPC code the real API uses for each
+STATUS_CODES = {
+    400: grpc.StatusCode.INVALID_ARGUMENT,
+    403: grpc.StatusCode.PERMISSION_DENIED,
+    429: grpc.StatusCode.RESOURCE_EXHAUSTED,
+    500: grpc.StatusCode.INTERNAL,
+    503: grpc.StatusCode.UNAVAILABLE,
+    504: grpc.StatusCode.DEADLINE_EXCEEDED,
+}
+
+
+def create_server(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    ttft: float = 0.2,
+    tokens: int = 50,
+    interval: float = 0.02,
+    text: str = DEFAULT_TEXT,
+    error_rate: float = 0.0,
+    error_status: int = 429,
+    slow_rate: float = 0.0,
+    slow_ttft: float = 2.0,
+) -> grpc.aio.Server:
+    from google.ai import generativelanguage as glm
+
+    pieces = _tokens(text, tokens)
+
+    def candidate(piece: str, finish: bool = False) -> bytes:
+        return glm.GenerateContentResponse.serialize(glm.GenerateContentResponse(candidates=[{
+            "content": {"role": "model", "parts": [{"text": piece}]},
+            "index": 0,
+            "finish_reason": "STOP" if finish else "FINISH_REASON_UNSPECIFIED",
+        }]))
+
+    # Serialized once, so the fake spends next to no CPU per chunk next to the code under test
+    answer = candidate(text, finish=True)
+    chunks = [candidate(piece, finish=i == len(pieces) - 1) for i, piece in enumerate(pieces)]
+
+    async def start(context: grpc.aio.ServicerContext) -> None:
+        if random.random() < error_rate:
+            await context.abort(STATUS_CODES.get(error_status, grpc.StatusCode.UNAVAILABLE), "Simulated upstream error")
+        await asyncio.sleep(slow_ttft if random.random() < slow_rate else ttft)
+
+    async def generate(request, context):
+        await start(context)
+        await asyncio.sleep(interval * len(pieces))
+        return answer
+
+    async def stream(request, context):
+        await start(context)
+        for i, chunk in enumerate(chunks):
+            yield chunk
+            if i < len(chunks) - 1:
+                await asyncio.sleep(interval)
+
+    handler = grpc.method_handlers_generic_handler("google.ai.generativelanguage.v1beta.GenerativeService", {
+        "GenerateContent": grpc.unary_unary_rpc_method_handler(
+            generate,
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=bytes,
+        ),
+        "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+            stream,
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=bytes,
+        ),
+    })
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((handler,))
+    server.add_insecure_port(f"{host}:{port}")
+    return server
+
+
+async def serve(**kwargs) -> None:
+    server = create_server(**kwargs)
+    await server.start()
+    await server.wait_for_termination()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini streaming server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=50, help="Number of streamed chunks")
+    parser.add_argument("--interval", type=float, default=0.02, help="Seconds between chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of failed requests")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests with a slow first token")
+    parser.add_argument("--slow-ttft", type=float, default=2.0, help="Seconds before the first token when slow")
+    args = parser.parse_args()
+    asyncio.run(serve(
+        host=args.host,
+        port=args.port,
+        ttft=args.ttft,
+        tokens=args.tokens,
+        interval=args.interval,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        slow_rate=args.slow_rate,
+        slow_ttft=args.slow_ttft,
+    ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint (vLLM, Ollama, ...).
+
+Streams ``/v1/chat/completions`` as server-sent events with a configurable
+time-to-first-token and token rate, and fails a fraction of requests. Route
+the backend to it with:
+
+    MODEL_ROUTES='[{"name": "local", "backend": "openai", "model": "fake", "base_url": "http://127.0.0.1:8767/v1"}]'
+
+Run standalone:
+
+    python -m benchmarks.fake_openai --port 8767 --ttft 0.05 --tokens 50 --interval 0.01
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from aiohttp import web
+
+from benchmarks.fake_gemini import DEFAULT_TEXT, _tokens
+
+
+def create_app(
+    ttft: float = 0.05,
+    tokens: int = 50,
+    interval: float = 0.01,
+    error_rate: float = 0.0,
+    text: str = DEFAULT_TEXT,
+) -> web.Application:
+    pieces = _tokens(text, tokens)
+
+    async def completions(request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        if random.random() < error_rate:
+            return web.json_response({"error": {"message": "Simulated upstream error"}}, status=503)
+        await asyncio.sleep(ttft)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, piece in enumerate(pieces):
+            chunk = {"model": payload.get("model"), "choices": [{"index": 0, "delta": {"content": piece}}]}
+            await response.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            if i < len(pieces) - 1:
+                await asyncio.sleep(interval)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible streaming server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--ttft", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=50, help="Number of streamed chunks")
+    parser.add_argument("--interval", type=float, default=0.01, help="Seconds between chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    args = parser.parse_args()
+    web.run_app(
+        create_app(args.ttft, args.tokens, args.interval, args.error_rate),
+        host=args.host,
+        port=args.port,
+        print=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
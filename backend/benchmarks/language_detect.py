@@ -0,0 +1,144 @@
+"""
+Accuracy corpus and micro-benchmark: precompiled language matcher vs. the
+previous substring scan.
+
+Every prompt in CORPUS is labelled with the language the answer should be
+in (None when the prompt doesn't name one). Both detectors are scored on it,
+misses are listed, and each is timed over the whole corpus.
+
+    cd backend && python -m benchmarks.language_detect --repeat 200
+"""
+import argparse
+import time
+
+from app.services.gemini_service import GeminiService
+
+CORPUS = [
+    # Plain mentions
+    ("Write a binary search in Python", "python"),
+    ("implement quicksort in javascript", "javascript"),
+    ("Show me a TypeScript interface for a user", "typescript"),
+    ("A Java class that parses CSV files", "java"),
+    ("How do I read a file in C#?", "csharp"),
+    ("Write a linked list in C++", "cpp"),
+    ("Fizzbuzz in Go please", "go"),
+    ("A Rust function that reverses a string", "rust"),
+    ("PHP script that sends an email", "php"),
+    ("Sum an array in Ruby", "ruby"),
+    ("Kotlin data class for an order", "kotlin"),
+    ("Swift struct for a 2D point", "swift"),
+    # Aliases
+    ("Express server in node.js", "javascript"),
+    ("a small nodejs CLI", "javascript"),
+    ("write it in JS", "javascript"),
+    ("Convert this to TS", "typescript"),
+    ("golang http handler", "go"),
+    ("python3 script to rename files", "python"),
+    ("csharp LINQ example", "csharp"),
+    ("cpp template for a max function", "cpp"),
+    ("A simple Node server with two routes", "javascript"),
+    # Words that merely contain a language name
+    ("Add some unit tests for this function", None),
+    ("That looks good, can you also handle errors?", None),
+    ("Explain how rusty iterators are", None),
+    ("Print the first 10 primes with tests", None),
+    ("Write a function that returns a list of the points", None),
+    ("It's a good idea to go through the algorithm first", None),
+    ("Let's go: sort these numbers", None),
+    ("Make the javascript version faster", "javascript"),
+    ("Python tests for the parser", "python"),
+    ("Write a Go program that prints hello", "go"),
+    ("nodes in a tree, written in rust", "rust"),
+    ("the settings file is missing", None),
+    ("Explain swiftly how a hash map works", None),
+    ("It also needs a gophers joke", None),
+    # Sentence-initial "Go" is the verb
+    ("Go ahead and write a Python script", "python"),
+    ("Go on", None),
+    ("Go for it", None),
+    ("Looks right. Go ahead with the Java version", "java"),
+    ("- Go through the list and sum it", None),
+    ("Now port it to Go", "go"),
+    # Several languages: the cued one is the target
+    ("Translate this Python code to Rust", "rust"),
+    ("Port my Java class into Kotlin", "kotlin"),
+    ("Rewrite this javascript using TypeScript", "typescript"),
+    ("I know Python, show me the same thing in Go", "go"),
+    ("Convert from C++ to C#", "csharp"),
+    ("Rewrite in Ruby the PHP snippet above", "ruby"),
+    ("In Java, what's the equivalent of a Python dict?", "java"),
+    # Nothing to detect
+    ("What is a closure?", None),
+    ("Explain big-O notation", None),
+    ("", None),
+]
+
+
+# Appended by --pad to time prompts that carry pasted code or logs
+PADDING = "\n" + "def handle(request):\n    value = request.args.get('id')\n    return render(value)\n" * 40
+
+
+def legacy(messages):
+    """The substring scan previously used by GeminiService"""
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            text = (msg.get("content") or "").lower()
+            synonyms = {
+                "js": "javascript",
+                "node": "javascript",
+                "node.js": "javascript",
+                "nodejs": "javascript",
+                "ts": "typescript",
+            }
+            for syn, canon in synonyms.items():
+                if syn in text:
+                    return canon
+            for lang in ["javascript", "typescript", "java", "python", "c#", "c++", "go", "rust", "php", "ruby", "kotlin", "swift"]:
+                if lang in text:
+                    return "csharp" if lang == "c#" else ("cpp" if lang == "c++" else lang)
+            return None
+    return None
+
+
+def score(detect, corpus):
+    misses = []
+    for prompt, expected in corpus:
+        got = detect([{"role": "user", "content": prompt}])
+        if got != expected:
+            misses.append((prompt, expected, got))
+    return misses
+
+
+def _time(detect, corpus, repeat: int) -> float:
+    batches = [[{"role": "user", "content": prompt}] for prompt, _ in corpus]
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for messages in batches:
+                detect(messages)
+        best = min(best, time.perf_counter() - start)
+    return best / (repeat * len(batches))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over the corpus per timing run")
+    parser.add_argument("--pad", action="store_true", help="Time prompts with ~3KB of pasted code appended")
+    parser.add_argument("--verbose", action="store_true", help="List every miss")
+    args = parser.parse_args()
+
+    print(f"{'detector':>10} {'accuracy':>10} {'misses':>8} {'per call':>10}")
+    for name, detect in (("legacy", legacy), ("compiled", GeminiService.detect_language)):
+        misses = score(detect, CORPUS)
+        timed = [(prompt + PADDING, expected) for prompt, expected in CORPUS] if args.pad else CORPUS
+        per_call = _time(detect, timed, args.repeat)
+        accuracy = 100 * (len(CORPUS) - len(misses)) / len(CORPUS)
+        print(f"{name:>10} {accuracy:>9.1f}% {len(misses):>8} {per_call * 1e6:>8.2f}us")
+        if args.verbose or name == "compiled":
+            for prompt, expected, got in misses:
+                print(f"{'':>12}{prompt!r}: expected {expected}, got {got}")
+
+
+if __name__ == "__main__":
+    main()
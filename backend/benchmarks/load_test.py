@@ -0,0 +1,241 @@
+"""
+End-to-end load test of the real FastAPI app against a fake model server and fake e2b.
+
+Starts both fakes and the app (uvicorn, one worker) as subprocesses, then runs
+--sessions concurrent sessions. Each session sends --turns chat streams and
+sandbox executions back to back, like a user iterating on code. Reported:
+
+- chat TTFB (first SSE byte), time to first token and full stream latency
+- tokens/sec per stream and across the whole run (~4 characters per token)
+- sandbox execution latency
+- p50/p95/p99 for every latency, plus errors and 429s
+- the app's RSS at idle, at peak and afterwards (sampled from /proc, Linux)
+
+By default chat goes to benchmarks.fake_openai through a MODEL_ROUTES
+openai route, which streams token by token, so TTFB and first-token times
+are real. With --upstream gemini it goes through the Gemini SDK's gRPC stream to
+benchmarks.fake_gemini instead, which streams just the same.
+
+Prompts and code differ per request, so the response and result caches only
+help when --cached is given. Any --max-* budget that is exceeded makes the
+exit status 1, so the run can gate a deploy.
+
+    cd backend && python -m benchmarks.load_test --sessions 50 --turns 3
+    cd backend && python -m benchmarks.load_test --sessions 20 --max-ttfb-p95-ms 800 --max-rss-mb 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+from benchmarks.common import fake_server, percentile, rss_mb
+
+
+class Results:
+    def __init__(self):
+        self.ttfb = []
+        self.first_token = []
+        self.chat_total = []
+        self.tokens_per_second = []
+        self.tokens = 0
+        self.sandbox_total = []
+        self.errors = {"chat": 0, "sandbox": 0}
+        self.rejected = 0
+        self.wall = 0.0
+        self.rss = (0.0, 0.0, 0.0)
+
+
+async def chat_turn(http: aiohttp.ClientSession, base: str, session_id: str, turn: int, results: Results, cached: bool):
+    prompt = "Write a python function to reverse a linked list"
+    if not cached:
+        prompt += f" (session {session_id}, turn {turn})"
+    start = time.perf_counter()
+    ttfb = first_token = None
+    chars = 0
+    ok = False
+    async with http.post(f"{base}/api/chat/stream", json={"message": prompt, "session_id": session_id}) as response:
+        if response.status != 200:
+            results.errors["chat"] += 1
+            return
+        buffer = b""
+        done = False
+        async for data in response.content.iter_any():
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            buffer += data
+            while b"\n\n" in buffer and not done:
+                frame, buffer = buffer.split(b"\n\n", 1)
+                for line in frame.split(b"\n"):
+                    if not line.startswith(b"data: "):
+                        continue
+                    payload = json.loads(line[6:])
+                    if payload.get("delta"):
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        chars += len(payload["delta"])
+                    if payload.get("done"):
+                        done = True
+                        ok = "error" not in (payload.get("metadata") or {})
+            if done:
+                break
+    total = time.perf_counter() - start
+    if not ok or first_token is None:
+        results.errors["chat"] += 1
+        return
+    results.ttfb.append(ttfb)
+    results.first_token.append(first_token)
+    results.chat_total.append(total)
+    tokens = (chars + 3) // 4
+    results.tokens += tokens
+    if total > first_token:
+        results.tokens_per_second.append(tokens / (total - first_token))
+
+
+async def sandbox_turn(http: aiohttp.ClientSession, base: str, session_id: str, turn: int, results: Results, cached: bool):
+    code = "print(sum(range(1000)))" if cached else f"print({turn!r}, {session_id!r})"
+    start = time.perf_counter()
+    async with http.post(
+        f"{base}/api/chat/sandbox/execute",
+        json={"code": code, "language": "python", "session_id": session_id},
+    ) as response:
+        body = await response.json()
+    if response.status == 429:
+        results.rejected += 1
+    elif response.status != 200 or not body.get("success"):
+        results.errors["sandbox"] += 1
+    else:
+        results.sandbox_total.append(time.perf_counter() - start)
+
+
+async def sample_rss(pid: int, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        samples.append(rss_mb(pid))
+        await asyncio.sleep(0.1)
+
+
+async def run(args, app_pid: int) -> Results:
+    base = f"http://{args.host}:{args.app_port}"
+    results = Results()
+    scenarios = {"chat": [chat_turn], "sandbox": [sandbox_turn], "both": [chat_turn, sandbox_turn]}[args.scenario]
+
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=0),
+        timeout=aiohttp.ClientTimeout(total=args.timeout),
+    ) as http:
+        # Warm up imports, connection pools and the model cache outside the measurement
+        await chat_turn(http, base, "warmup", 0, Results(), cached=True)
+        await sandbox_turn(http, base, "warmup", 0, Results(), cached=True)
+        idle_rss = rss_mb(app_pid)
+
+        async def session(index: int):
+            for turn in range(args.turns):
+                for scenario in scenarios:
+                    await scenario(http, base, f"load-{index}", turn, results, args.cached)
+
+        stop = asyncio.Event()
+        samples = []
+        sampler = asyncio.create_task(sample_rss(app_pid, stop, samples))
+        started = time.perf_counter()
+        await asyncio.gather(*(session(i) for i in range(args.sessions)))
+        results.wall = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+    results.rss = (idle_rss, max(samples, default=0.0), rss_mb(app_pid))
+    return results
+
+
+def report(args, results: Results) -> list:
+    def row(name, values, scale=1000, unit="ms"):
+        if not values:
+            print(f"{name:<20} {'-':>9} {'-':>9} {'-':>9}")
+            return
+        cells = " ".join(f"{percentile(values, p) * scale:>7.1f}{unit}" for p in (50, 95, 99))
+        print(f"{name:<20} {cells}")
+
+    print(f"{args.sessions} sessions x {args.turns} turns ({args.scenario}, {args.upstream}) in {results.wall:.2f}s")
+    print(f"{'metric':<20} {'p50':>9} {'p95':>9} {'p99':>9}")
+    row("chat ttfb", results.ttfb)
+    row("chat first token", results.first_token)
+    row("chat total", results.chat_total)
+    row("chat tokens/s", results.tokens_per_second, scale=1, unit="  ")
+    row("sandbox total", results.sandbox_total)
+    print(f"aggregate: {results.tokens / results.wall:.0f} tokens/s, "
+          f"{(len(results.chat_total) + len(results.sandbox_total)) / results.wall:.1f} requests/s")
+    print(f"errors: chat {results.errors['chat']}, sandbox {results.errors['sandbox']}, 429s {results.rejected}")
+    idle, peak, after = results.rss
+    print(f"app rss: idle {idle:.1f}MiB, peak {peak:.1f}MiB, after {after:.1f}MiB")
+
+    budgets = [
+        ("chat ttfb p95", args.max_ttfb_p95_ms, results.ttfb),
+        ("chat total p95", args.max_chat_p95_ms, results.chat_total),
+        ("sandbox total p95", args.max_sandbox_p95_ms, results.sandbox_total),
+    ]
+    failures = [
+        f"{name} {percentile(values, 95) * 1000:.1f}ms > {limit:g}ms"
+        for name, limit, values in budgets
+        if limit is not None and values and percentile(values, 95) * 1000 > limit
+    ]
+    if args.max_rss_mb is not None and peak > args.max_rss_mb:
+        failures.append(f"peak rss {peak:.1f}MiB > {args.max_rss_mb:g}MiB")
+    if args.max_errors is not None and sum(results.errors.values()) > args.max_errors:
+        failures.append(f"{sum(results.errors.values())} errors > {args.max_errors}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent sessions")
+    parser.add_argument("--turns", type=int, default=3, help="Requests of each kind per session")
+    parser.add_argument("--scenario", choices=("chat", "sandbox", "both"), default="both")
+    parser.add_argument("--cached", action="store_true", help="Repeat identical prompts and code so caches hit")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--app-port", type=int, default=8773)
+    parser.add_argument("--upstream", choices=("openai", "gemini"), default="openai", help="Fake model server to chat with")
+    parser.add_argument("--gemini-port", type=int, default=8771, help="Port of the fake model server")
+    parser.add_argument("--e2b-port", type=int, default=8772)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Fake model seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=50, help="Fake model chunks per answer")
+    parser.add_argument("--interval", type=float, default=0.02, help="Fake model seconds between chunks")
+    parser.add_argument("--create-latency", type=float, default=0.05, help="Fake e2b sandbox create seconds")
+    parser.add_argument("--run-time", type=float, default=0.0, help="Fake e2b process run seconds")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout")
+    parser.add_argument("--max-ttfb-p95-ms", type=float)
+    parser.add_argument("--max-chat-p95-ms", type=float)
+    parser.add_argument("--max-sandbox-p95-ms", type=float)
+    parser.add_argument("--max-rss-mb", type=float)
+    parser.add_argument("--max-errors", type=int)
+    args = parser.parse_args()
+
+    # The app subprocess inherits these; anything already set (e.g. SANDBOX_BACKEND) is kept
+    os.environ["GEMINI_API_ENDPOINT"] = f"http://{args.host}:{args.gemini_port}"
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ["E2B_API_URL"] = f"http://{args.host}:{args.e2b_port}"
+    os.environ.setdefault("E2B_API_KEY", "bench")
+    if args.upstream == "openai":
+        os.environ["MODEL_ROUTES"] = json.dumps([{
+            "name": "fake",
+            "backend": "openai",
+            "model": "fake",
+            "base_url": f"http://{args.host}:{args.gemini_port}/v1",
+        }])
+
+    model_args = ("--ttft", str(args.ttft), "--tokens", str(args.tokens), "--interval", str(args.interval))
+    e2b_args = ("--create-latency", str(args.create_latency), "--run-time", str(args.run_time))
+    with fake_server(f"benchmarks.fake_{args.upstream}", args.host, args.gemini_port, *model_args), \
+            fake_server("benchmarks.fake_e2b", args.host, args.e2b_port, *e2b_args), \
+            fake_server("uvicorn", args.host, args.app_port, "--log-level", "warning", "app.main:app") as app:
+        results = asyncio.run(run(args, app.pid))
+
+    failures = report(args, results)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-execution HTTP overhead of SandboxService against the fake e2b server.
+
+Compares a fresh ClientSession per execution (the previous behaviour) with
+the pooled keep-alive session. The fake processes exit immediately so only
+HTTP and server time is measured; "overhead" subtracts the fake
+server's own latencies. Over loopback without TLS the gap is mostly TCP
+setup and session construction; against the real API each avoided
+connection also saves a TLS handshake and a network round trip.
+
+    cd backend && python -m benchmarks.sandbox_http --runs 200 --concurrency 1,20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.common import fake_server, percentile
+
+
+async def run_mode(pooled: bool, runs: int, concurrency: int):
+    from app.models.chat import SandboxRequest
+    from app.services.sandbox_service import SandboxService
+
+    request = SandboxRequest(code="print('hi')", language="python", session_id="bench", bypass_cache=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    shared = SandboxService()
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            # Old behaviour: a brand-new session (and TCP connections) per execution
+            service = shared if pooled else SandboxService()
+            start = time.perf_counter()
+            result = await service.execute_code(request)
+            latencies.append(time.perf_counter() - start)
+            if not pooled:
+                await service.close()
+            if not result.success:
+                raise RuntimeError(result.error)
+
+    await shared.start()
+    await asyncio.gather(*(one() for _ in range(runs)))
+    await shared.close()
+    return latencies
+
+
+async def run(args, server_latency: float):
+    print(f"{'mode':<12} {'conc':>5} {'p50':>9} {'p95':>9} {'overhead p50':>13}")
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        for pooled in (False, True):
+            latencies = await run_mode(pooled, args.runs, concurrency)
+            p50 = statistics.median(latencies)
+            name = "pooled" if pooled else "per-request"
+            print(
+                f"{name:<12} {concurrency:>5} {p50 * 1000:>7.2f}ms {percentile(latencies, 95) * 1000:>7.2f}ms "
+                f"{(p50 - server_latency) * 1000:>11.2f}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,20")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--create-latency", type=float, default=0.0)
+    parser.add_argument("--io-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    os.environ["E2B_API_URL"] = f"http://{args.host}:{args.port}"
+    os.environ.setdefault("E2B_API_KEY", "bench")
+    server_latency = args.create_latency + 2 * args.io_latency
+    server_args = ("--create-latency", str(args.create_latency), "--io-latency", str(args.io_latency))
+    with fake_server("benchmarks.fake_e2b", args.host, args.port, *server_args):
+        asyncio.run(run(args, server_latency))
+
+
+if __name__ == "__main__":
+    main()
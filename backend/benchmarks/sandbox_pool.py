@@ -0,0 +1,80 @@
+"""
+Cold-start vs warm-pool execution latency against the fake e2b server.
+
+"cold" creates and deletes a sandbox per execution (SANDBOX_POOL_ENABLED=0);
+"warm" leases pre-provisioned sandboxes and resets them between runs. The
+fake server's --create-latency stands in for sandbox boot time.
+
+    cd backend && python -m benchmarks.sandbox_pool --runs 100 --concurrency 4 --create-latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.common import fake_server, percentile
+
+
+async def run_mode(warm: bool, args):
+    os.environ["SANDBOX_POOL_ENABLED"] = "1" if warm else "0"
+    os.environ["SANDBOX_POOL_MIN"] = str(args.concurrency)
+    os.environ["SANDBOX_POOL_MAX"] = str(args.concurrency)
+    from app.models.chat import SandboxRequest
+    from app.services.sandbox_service import SandboxService
+
+    service = SandboxService()
+    request = SandboxRequest(code="print('hi')", language="python", session_id="bench", bypass_cache=True)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            result = await service.execute_code(request)
+            latencies.append(time.perf_counter() - start)
+            if not result.success:
+                raise RuntimeError(result.error)
+
+    await service.start()
+    if warm:
+        # Let the maintenance task pre-provision before measuring
+        while service.pool.total["python"] < args.concurrency:
+            await asyncio.sleep(0.05)
+    await asyncio.gather(*(one() for _ in range(args.runs)))
+    stats = service.pool.stats() if warm else None
+    await service.close()
+    return latencies, stats
+
+
+async def run(args):
+    print(f"{'mode':<6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for warm in (False, True):
+        latencies, stats = await run_mode(warm, args)
+        print(
+            f"{'warm' if warm else 'cold':<6} {statistics.median(latencies) * 1000:>7.1f}ms "
+            f"{percentile(latencies, 95) * 1000:>7.1f}ms {percentile(latencies, 99) * 1000:>7.1f}ms"
+        )
+        if stats:
+            print(f"       pool: {stats['warm_hits']} warm hits, {stats['cold_starts']} cold starts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--create-latency", type=float, default=0.5)
+    parser.add_argument("--io-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    os.environ["E2B_API_URL"] = f"http://{args.host}:{args.port}"
+    os.environ.setdefault("E2B_API_KEY", "bench")
+    server_args = ("--create-latency", str(args.create_latency), "--io-latency", str(args.io_latency))
+    with fake_server("benchmarks.fake_e2b", args.host, args.port, *server_args):
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+SSE framing benchmark: frames/sec and bytes/response, old vs. new encoder.
+
+Replays a synthetic token stream (prose deltas plus one artifact) through
+the previous dict + to_jsonable + json.dumps framing and through SSEEncoder,
+with and without delta coalescing. Coalescing is measured with a paced
+source so that the 20 ms window behaves as it would behind a real model.
+
+    cd backend && python -m benchmarks.sse_framing --tokens 2000 --pace 0.002
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.api.chat import to_jsonable
+from app.api.sse import HEARTBEAT, SSEEncoder, coalesce_chunks
+from app.models.chat import CodeArtifact, StreamChunk
+
+
+def synthetic_chunks(tokens: int):
+    artifact_id = "bench-artifact"
+    chunks = [StreamChunk(delta=f"word{i} ") for i in range(tokens // 2)]
+    chunks.append(StreamChunk(
+        delta="",
+        event="artifact_start",
+        artifact_id=artifact_id,
+        artifact_data=CodeArtifact(id=artifact_id, language="python", title="Bench", code=""),
+    ))
+    chunks += [StreamChunk(delta=f"x{i} = {i}\n", event="artifact_delta", artifact_id=artifact_id) for i in range(tokens // 2)]
+    chunks.append(StreamChunk(delta="", event="artifact_end", artifact_id=artifact_id, artifact_detected=True))
+    chunks.append(StreamChunk(delta="", done=True, metadata={"context": {"prompt_tokens": 1200}}))
+    return chunks
+
+
+def legacy_frames(chunks):
+    for chunk in chunks:
+        chunk_data = {
+            "delta": chunk.delta,
+            "done": chunk.done,
+            "artifact_detected": chunk.artifact_detected,
+            "artifact_data": to_jsonable(chunk.artifact_data) if chunk.artifact_data else None,
+            "artifact_id": chunk.artifact_id,
+            "metadata": to_jsonable(chunk.metadata) if chunk.metadata else None,
+        }
+        event_line = f"event: {chunk.event}\n" if chunk.event != "delta" else ""
+        yield f"{event_line}data: {json.dumps(chunk_data)}\n\n".encode()
+
+
+def encoder_frames(chunks):
+    encoder = SSEEncoder()
+    for chunk in chunks:
+        yield encoder.encode(chunk)
+
+
+async def paced(chunks, pace: float):
+    for chunk in chunks:
+        await asyncio.sleep(pace)
+        yield chunk
+
+
+async def coalesced_frames(chunks, pace: float, interval: float, max_bytes: int):
+    encoder = SSEEncoder()
+    frames = []
+    async for chunk in coalesce_chunks(paced(chunks, pace), interval=interval, max_bytes=max_bytes):
+        if chunk is not HEARTBEAT:
+            frames.append(encoder.encode(chunk))
+    return frames
+
+
+def _report(name: str, frames, elapsed: float):
+    total = sum(len(f) for f in frames)
+    print(f"{name:<28} {len(frames):>8} {total:>10} {len(frames) / elapsed:>14,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--pace", type=float, default=0.002, help="Seconds between model tokens for the coalescing run")
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--max-bytes", type=int, default=1024)
+    args = parser.parse_args()
+    chunks = synthetic_chunks(args.tokens)
+
+    print(f"{'framing':<28} {'frames':>8} {'bytes':>10} {'frames/sec':>14}")
+    for name, fn in (("legacy json.dumps", legacy_frames), ("SSEEncoder", encoder_frames)):
+        start = time.perf_counter()
+        frames = list(fn(chunks))
+        _report(name, frames, time.perf_counter() - start)
+
+    frames = asyncio.run(coalesced_frames(chunks, args.pace, args.interval, args.max_bytes))
+    total = sum(len(f) for f in frames)
+    print(f"{'SSEEncoder + coalescing':<28} {len(frames):>8} {total:>10} {'(paced)':>14}")
+
+
+if __name__ == "__main__":
+    main()
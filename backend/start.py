@@ -1,32 +1,65 @@
 #!/usr/bin/env python3
 """
 Railway startup script for AI Coding Agent backend
+
+Dependencies are installed at build time (Dockerfile / nixpacks); set
+INSTALL_DEPS=1 to install them on boot as well. STARTUP_IMPORT_REPORT=1
+prints the slowest imports of the app before starting.
 """
 import subprocess
 import sys
 import os
 
+
+def import_report(limit=15):
+    """Print where importing app.main spends its time, grouped by top-level package"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app.main'],
+        capture_output=True, text=True
+    )
+    totals = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    print(f"Import time by package (total {sum(totals.values()) / 1000:.0f}ms):")
+    for package, micros in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]:
+        print(f"  {micros / 1000:8.1f}ms  {package}")
+
+
 def main():
     # Ensure we're in the right directory
-    os.chdir('/app')
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    
+    if os.environ.get('INSTALL_DEPS') == '1':
+        try:
+            subprocess.run([sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'], 
+                           check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Warning: pip install failed: {e}")
+    
+    if os.environ.get('STARTUP_IMPORT_REPORT') == '1':
+        import_report()
     
-    # Install dependencies if needed (Railway should handle this, but just in case)
-    try:
-        subprocess.run([sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'], 
-                       check=True, capture_output=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Warning: pip install failed: {e}")
+    # Multiple workers share sessions, replay buffers and caches through SHARED_STATE_URL
+    workers = os.environ.get('WEB_CONCURRENCY', '1')
+    if int(workers) > 1 and not os.environ.get('SHARED_STATE_URL'):
+        print("Warning: WEB_CONCURRENCY > 1 without SHARED_STATE_URL; sessions will not be shared between workers.")
     
     # Start the uvicorn server
     cmd = [
         sys.executable, '-m', 'uvicorn', 
         'app.main:app', 
         '--host', '0.0.0.0', 
-        '--port', os.environ.get('PORT', '8000')
+        '--port', os.environ.get('PORT', '8000'),
+        '--workers', workers
     ]
     
-    print(f"Starting server with command: {' '.join(cmd)}")
-    subprocess.run(cmd)
+    print(f"Starting server with command: {' '.join(cmd)}", flush=True)
+    # Replace this process so signals reach uvicorn directly
+    os.execv(sys.executable, cmd)
 
 if __name__ == '__main__':
     main()
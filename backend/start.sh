@@ -3,8 +3,10 @@
 # Ensure we're in the right directory
 cd /app
 
-# Install dependencies if not already installed
-pip install -r requirements.txt
+# Dependencies are installed at build time; INSTALL_DEPS=1 reinstalls on boot
+if [ "$INSTALL_DEPS" = "1" ]; then
+    pip install -r requirements.txt
+fi
 
 # Start the application
-python -m uvicorn app.main:app --host 0.0.0.0 --port $PORT
+python -m uvicorn app.main:app --host 0.0.0.0 --port $PORT --workers ${WEB_CONCURRENCY:-1}
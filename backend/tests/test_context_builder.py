@@ -0,0 +1,38 @@
+import asyncio
+
+from app.api.chat import prompt_messages
+from app.services.context_builder import ContextBuilder
+from app.services.memory_service import MemoryService
+from app.services.session_store import SessionStore
+
+
+def test_repeated_builds_summarize_each_message_once():
+    builder = ContextBuilder(token_budget=1200, keep_recent=4, summary_tokens=600)
+    memory = MemoryService(store=SessionStore())
+
+    summarized = 0
+    for index in range(40):
+        role = "user" if index % 2 == 0 else "assistant"
+        asyncio.run(memory.add_message("session", role, f"message {index} " + "lorem ipsum " * 40))
+        messages = prompt_messages(asyncio.run(memory.get_conversation_history("session")))
+
+        kept, stats = builder.build(messages, session_id="session")
+
+        assert stats["prompt_tokens_saved"] >= 0
+        if stats["summarized_messages"]:
+            summarized += 1
+            lines = kept[0]["content"].splitlines()[1:]
+            numbers = [int(line.split()[2]) for line in lines]
+            assert numbers == sorted(set(numbers))
+    assert summarized > 0
+    assert builder.stats()["prompt_tokens_saved_total"] > 0
+
+
+def test_no_summary_space_reserved_when_history_fits():
+    builder = ContextBuilder(token_budget=1000, keep_recent=4, summary_tokens=500)
+    messages = [{"role": "user", "content": "lorem ipsum " * 40} for _ in range(6)]
+
+    kept, stats = builder.build(messages, session_id="session")
+
+    assert stats["summarized_messages"] == 0
+    assert len(kept) == len(messages)
@@ -15,37 +15,15 @@ export const useChat = () => {
     setLoading,
     setStreaming,
     addArtifact,
+    updateArtifactCode,
     setSessionId,
     selectedLanguage,
   } = useChatStore();
 
   const generateSessionId = useCallback(() => uuidv4(), []);
 
-  const artifactBufferRef = useRef<string>('');
-  const insideArtifactRef = useRef<boolean>(false);
-
-  const stripArtifactsStreaming = (delta: string): string => {
-    if (!delta) return '';
-    let text = '';
-    let buf = artifactBufferRef.current + delta;
-    let inside = insideArtifactRef.current;
-    while (buf.length > 0) {
-      if (!inside) {
-        const start = buf.indexOf('<artifact');
-        if (start === -1) { text += buf; buf = ''; break; }
-        text += buf.slice(0, start);
-        buf = buf.slice(start);
-        inside = true;
-      }
-      const end = buf.indexOf('</artifact>');
-      if (end === -1) break;
-      buf = buf.slice(end + '</artifact>'.length);
-      inside = false;
-    }
-    artifactBufferRef.current = buf;
-    insideArtifactRef.current = inside;
-    return text;
-  };
+  // Artifact code assembled from artifact_delta events, keyed by artifact id
+  const artifactCodeRef = useRef<Record<string, string>>({});
 
   const sendMessageStream = useCallback(async (message: string) => {
     const sessionId = currentSessionId || generateSessionId();
@@ -55,62 +33,81 @@ export const useChat = () => {
     const hint = selectedLanguage ? `(language: ${selectedLanguage}) ` : '';
     const messageWithHint = hint + message;
 
+    // Earlier turns, resent only if the server no longer holds this session
+    const history = useChatStore.getState().messages
+      .filter(m => m.content)
+      .map(({ role, content }) => ({ role, content }));
+
     addMessage({ role: 'user', content: messageWithHint });
     addMessage({ role: 'assistant', content: '' });
 
     setLoading(true);
     setStreaming(true);
 
+    // History lives server-side per session, so only the new turn is sent
     const request: ChatRequest = {
       message: messageWithHint,
       session_id: sessionId,
-      conversation_history: useChatStore.getState().messages.map(msg => ({
-        role: msg.role,
-        content: msg.content,
-        timestamp: msg.timestamp,
-      })),
+      expect_history: history.length > 0,
     };
 
-    artifactBufferRef.current = '';
-    insideArtifactRef.current = false;
+    artifactCodeRef.current = {};
 
     try {
       await streamChat(
         request,
         (chunk: StreamChunk) => {
-          if (chunk.delta) {
-            const cleaned = stripArtifactsStreaming(chunk.delta);
-            if (cleaned) {
-              const state = useChatStore.getState();
-              const last = [...state.messages].reverse().find(m => m.role === 'assistant');
-              if (last) state.updateMessage(last.id, last.content + cleaned);
-            }
-          }
-          if (chunk.artifact_detected && chunk.artifact_data) {
-            console.log('Artifact detected in stream:', chunk.artifact_data.title);
-            // Ensure the artifact has the current timestamp
-            const artifactWithTimestamp = {
-              ...chunk.artifact_data,
-              created_at: new Date()
-            };
-            addArtifact(artifactWithTimestamp);
+          switch (chunk.event) {
+            case 'artifact_start':
+              if (chunk.artifact_id && chunk.artifact_data) {
+                artifactCodeRef.current[chunk.artifact_id] = '';
+                addArtifact({ ...chunk.artifact_data, created_at: new Date() });
+              }
+              break;
+            case 'artifact_delta':
+              if (chunk.artifact_id && chunk.delta) {
+                const code = (artifactCodeRef.current[chunk.artifact_id] ?? '') + chunk.delta;
+                artifactCodeRef.current[chunk.artifact_id] = code;
+                updateArtifactCode(chunk.artifact_id, code);
+              }
+              break;
+            case 'artifact_end':
+              if (chunk.artifact_id) {
+                updateArtifactCode(chunk.artifact_id, (artifactCodeRef.current[chunk.artifact_id] ?? '').trim());
+                delete artifactCodeRef.current[chunk.artifact_id];
+              }
+              break;
+            default:
+              if (chunk.delta) {
+                const state = useChatStore.getState();
+                const last = [...state.messages].reverse().find(m => m.role === 'assistant');
+                if (last) state.updateMessage(last.id, last.content + chunk.delta);
+              }
           }
           if (chunk.done) { setLoading(false); setStreaming(false); }
           if (chunk.error) { setLoading(false); setStreaming(false); console.error('Streaming error:', chunk.error); }
         },
-        (error) => { setLoading(false); setStreaming(false); console.error('Chat error:', error); }
+        (error) => {
+          setLoading(false);
+          setStreaming(false);
+          console.error('Chat error:', error);
+          // Show it in the answer, like the server's own "Error:" chunks
+          const state = useChatStore.getState();
+          const last = [...state.messages].reverse().find(m => m.role === 'assistant');
+          if (last) state.updateMessage(last.id, `${last.content}${last.content ? '\n\n' : ''}Error: ${error.message}`);
+        },
+        history
       );
     } catch (error) {
       setLoading(false);
       setStreaming(false);
       console.error('Chat error:', error);
     }
-  }, [currentSessionId, setSessionId, addMessage, setLoading, setStreaming, addArtifact, generateSessionId, selectedLanguage]);
+  }, [currentSessionId, setSessionId, addMessage, setLoading, setStreaming, addArtifact, updateArtifactCode, generateSessionId, selectedLanguage]);
 
   const clearConversation = useCallback(() => {
     useChatStore.getState().clearMessages();
-    setSessionId(generateSessionId());
-  }, [setSessionId, generateSessionId]);
+  }, []);
 
   return { messages, isLoading, isStreaming, currentSessionId, sendMessage: sendMessageStream, clearConversation };
 };
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import type { StreamChunk, SandboxResponse } from '@/types';
+import type { StreamChunk, StreamEvent, SandboxResponse } from '@/types';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
 
@@ -23,67 +23,113 @@ export interface ChatRequest {
   message: string;
   session_id: string;
   conversation_history?: any[];
+  expect_history?: boolean;
 }
 
 export interface SandboxRequest {
   code: string;
   language: string;
   session_id: string;
+  bypass_cache?: boolean;
 }
 
+const MAX_STREAM_RESUMES = 3;
+
 export const streamChat = async (
   request: ChatRequest,
   onChunk: (chunk: StreamChunk) => void,
-  onError?: (error: Error) => void
+  onError?: (error: Error) => void,
+  history?: { role: string; content: string }[]
 ): Promise<void> => {
-  try {
-    const gemini = localStorage.getItem('geminiApiKey') || '';
-    const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        ...(gemini ? { 'x-gemini-api-key': gemini } : {}),
-      },
-      body: JSON.stringify(request),
-    });
-
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
-    }
+  // Last SSE id received; a dropped connection resumes from here instead of re-asking
+  let lastEventId: string | null = null;
+  let finished = false;
+  let reseeded = false;
 
-    const reader = response.body?.getReader();
-    if (!reader) {
-      throw new Error('No response body');
-    }
+  for (let attempt = 0; !finished; attempt++) {
+    try {
+      const gemini = localStorage.getItem('geminiApiKey') || '';
+      const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          ...(gemini ? { 'x-gemini-api-key': gemini } : {}),
+          ...(lastEventId ? { 'Last-Event-ID': lastEventId } : {}),
+        },
+        body: JSON.stringify(request),
+      });
 
-    const decoder = new TextDecoder();
-    let buffer = '';
+      if (response.status === 404 && lastEventId) {
+        // The server no longer has the interrupted answer; asking again is the user's call
+        onError?.(new Error('The interrupted response is no longer available. Please send the message again.'));
+        return;
+      }
+      if (response.status === 409 && request.expect_history && history && !reseeded) {
+        // The server lost this session (restart, eviction, another worker); resend the history once
+        request = { ...request, expect_history: false, conversation_history: history };
+        reseeded = true;
+        attempt--;
+        continue;
+      }
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
 
-    while (true) {
-      const { done, value } = await reader.read();
-      
-      if (done) {
-        break;
+      const reader = response.body?.getReader();
+      if (!reader) {
+        throw new Error('No response body');
       }
 
-      buffer += decoder.decode(value, { stream: true });
-      const lines = buffer.split('\n');
-      buffer = lines.pop() || '';
-
-      for (const line of lines) {
-        if (line.startsWith('data: ')) {
-          try {
-            const data = JSON.parse(line.slice(6));
-            onChunk(data);
-          } catch (e) {
-            console.error('Error parsing SSE data:', e);
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let event: StreamEvent = 'delta';
+      let id: string | null = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        
+        if (done) {
+          break;
+        }
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() || '';
+
+        for (const line of lines) {
+          if (line.startsWith('id: ')) {
+            id = line.slice(4);
+          } else if (line.startsWith('event: ')) {
+            event = line.slice(7) as StreamEvent;
+          } else if (line.startsWith('data: ')) {
+            try {
+              const data = JSON.parse(line.slice(6));
+              onChunk({ ...data, event });
+              if (data.done) finished = true;
+            } catch (e) {
+              console.error('Error parsing SSE data:', e);
+            }
+          } else if (line === '') {
+            // Blank line ends an SSE message; the next one defaults to a text delta
+            if (id) lastEventId = id;
+            event = 'delta';
+            id = null;
           }
         }
       }
+      if (!finished && (!lastEventId || attempt >= MAX_STREAM_RESUMES)) {
+        throw new Error('Stream ended before completion');
+      }
+    } catch (error) {
+      if (lastEventId && attempt < MAX_STREAM_RESUMES) {
+        console.warn('Stream interrupted, resuming from event', lastEventId);
+        await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+        continue;
+      }
+      console.error('Streaming error:', error);
+      onError?.(error as Error);
+      return;
     }
-  } catch (error) {
-    console.error('Streaming error:', error);
-    onError?.(error as Error);
   }
 };
 
@@ -107,6 +153,14 @@ export const sendMessage = async (request: ChatRequest) => {
   }
 };
 
+export const clearSession = async (sessionId: string) => {
+  try {
+    await apiClient.delete(`/api/chat/session/${encodeURIComponent(sessionId)}`);
+  } catch (error) {
+    console.error('Clear session error:', error);
+  }
+};
+
 export const healthCheck = async () => {
   try {
     const response = await apiClient.get('/health');
@@ -1,5 +1,7 @@
 import { create } from 'zustand';
 import type { AppState, ChatMessage } from '@/types';
+import { clearSession } from '@/lib/api';
+import { v4 as uuidv4 } from 'uuid';
 
 export type Theme = 'dark' | 'clean-light' | 'sleek-dark' | 'vibrant-tech';
 
@@ -95,6 +97,17 @@ export const useChatStore = create<AppState & {
     }));
   },
 
+  updateArtifactCode: (id, code) => {
+    set((state) => ({
+      artifacts: state.artifacts.map((artifact) =>
+        artifact.id === id ? { ...artifact, code } : artifact
+      ),
+      currentArtifact: state.currentArtifact?.id === id
+        ? { ...state.currentArtifact, code }
+        : state.currentArtifact,
+    }));
+  },
+
   getArtifactById: (id) => {
     const state = get();
     return state.artifacts.find(artifact => artifact.id === id) || null;
@@ -105,7 +118,11 @@ export const useChatStore = create<AppState & {
   },
 
   clearMessages: () => {
+    // History lives server-side, so a cleared chat must also start a new session
+    const { currentSessionId } = get();
+    if (currentSessionId) void clearSession(currentSessionId);
     set({ 
+      currentSessionId: uuidv4(),
       messages: [],
       currentArtifact: null,
       artifacts: [], // Clear all artifacts
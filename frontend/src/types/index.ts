@@ -36,17 +36,22 @@ export interface AppState extends ChatState, SidebarState {
   toggleSidebar: () => void;
   setCurrentArtifact: (artifact: CodeArtifact | null) => void;
   addArtifact: (artifact: CodeArtifact) => void;
+  updateArtifactCode: (id: string, code: string) => void;
   getArtifactById: (id: string) => CodeArtifact | null;
   setActiveTab: (tab: 'code' | 'preview') => void;
   clearMessages: () => void;
   setSessionId: (sessionId: string) => void;
 }
 
+export type StreamEvent = 'delta' | 'artifact_start' | 'artifact_delta' | 'artifact_end';
+
 export interface StreamChunk {
+  event?: StreamEvent;
   delta: string;
   done: boolean;
   artifact_detected?: boolean;
   artifact_data?: CodeArtifact;
+  artifact_id?: string;
   metadata?: any;
   error?: string;
 }
@@ -57,4 +62,5 @@ export interface SandboxResponse {
   execution_time?: number;
   success: boolean;
   preview_url?: string;
+  cached?: boolean;
 }